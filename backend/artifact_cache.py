@@ -0,0 +1,134 @@
+import atexit
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 500
+RESULT_FILE = "compile_result.json"
+
+
+class ArtifactCache:
+    """LRU cache of compiled outputs (executables, .class files) keyed by source hash.
+
+    A successful compile's output files are copied into the cache together with
+    the compiler's stdout/stderr; a later run of the same source copies them back
+    and skips the compiler. Without a directory each process starts cold in its
+    own temporary directory, removed at exit - which is what makes dispatcher
+    affinity worthwhile. A given directory persists: entries left by a previous
+    process are reloaded (least recently used first) and pruned to max_entries.
+    It must not be shared by concurrently running processes.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.directory = directory or tempfile.mkdtemp(prefix="compile_artifacts_")
+        os.makedirs(self.directory, exist_ok=True)
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        if directory is None:
+            atexit.register(self.close)
+        else:
+            self._load()
+
+    def _load(self):
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if name.startswith("staging_"):
+                # Left by a store interrupted mid-copy
+                shutil.rmtree(path, ignore_errors=True)
+            elif len(name) == 64 and os.path.exists(os.path.join(path, RESULT_FILE)):
+                found.append((os.path.getmtime(path), name, path))
+        for _, key, path in sorted(found):
+            self.entries[key] = path
+        evicted = []
+        while len(self.entries) > self.max_entries:
+            evicted.append(self.entries.popitem(last=False)[1])
+            self.evictions += 1
+        for path in evicted:
+            shutil.rmtree(path, ignore_errors=True)
+        if self.entries:
+            logger.info("Reloaded %d cached artifacts from %s", len(self.entries), self.directory)
+
+    def close(self):
+        """Remove the cache directory and everything in it."""
+        with self.lock:
+            self.entries.clear()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    @staticmethod
+    def key(language: str, code: str, command) -> str:
+        material = json.dumps([language, list(command), code])
+        return hashlib.sha256(material.encode()).hexdigest()
+
+    def restore(self, key: str, target_dir: str) -> Optional[Dict[str, Any]]:
+        """Copy cached artifacts into target_dir and return the cached compile result, or None on a miss."""
+        with self.lock:
+            path = self.entries.get(key)
+            if path is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        try:
+            with open(os.path.join(path, RESULT_FILE)) as f:
+                compile_result = json.load(f)
+            shutil.copytree(os.path.join(path, "files"), target_dir, dirs_exist_ok=True)
+            # Recency survives a restart of a persistent cache
+            os.utime(path)
+            return compile_result
+        except OSError as e:
+            # Evicted between lookup and copy; compile normally
+            logger.warning("Artifact cache entry %s unreadable: %s", key[:12], e)
+            return None
+
+    def store(self, key: str, build_dir: str, exclude, compile_result: Dict[str, Any]):
+        """Cache every file compilation produced in build_dir, except the sources in exclude."""
+        with self.lock:
+            if key in self.entries:
+                return
+        staging = tempfile.mkdtemp(dir=self.directory, prefix="staging_")
+        try:
+            shutil.copytree(build_dir, os.path.join(staging, "files"),
+                            ignore=lambda d, names: [n for n in names if n in exclude and d == build_dir])
+            with open(os.path.join(staging, RESULT_FILE), 'w') as f:
+                json.dump(compile_result, f)
+            final = os.path.join(self.directory, key)
+            os.rename(staging, final)
+        except OSError as e:
+            logger.warning("Could not cache artifacts for %s: %s", key[:12], e)
+            shutil.rmtree(staging, ignore_errors=True)
+            return
+        evicted = []
+        with self.lock:
+            self.entries[key] = final
+            self.stores += 1
+            while len(self.entries) > self.max_entries:
+                evicted.append(self.entries.popitem(last=False)[1])
+                self.evictions += 1
+        for path in evicted:
+            shutil.rmtree(path, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self.entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "stores": self.stores,
+                "evictions": self.evictions
+            }
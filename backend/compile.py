@@ -1,6 +1,7 @@
 from flask import Flask, request, jsonify
 from flask_cors import CORS
 import subprocess
+import requests
 import tempfile
 import os
 import uuid
@@ -9,13 +10,27 @@ import re
 import platform
 import shutil
 import logging
-
-# Set up logging
-logging.basicConfig(level=logging.DEBUG, 
-                    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+import difflib
+import argparse
+import atexit
+import threading
+import time
+
+from log_config import setup_logging, init_app, Redacted
+from profiling import init_profiling, timed_wait
+from response_encoding import init_compression, encode_response, encoders_available
+from toolchains import ToolchainRegistry
+from artifact_cache import ArtifactCache
+from project_build import ProjectBuilder, ProjectSessionStore, ProjectError, read_project_files
+
+# Structured, queue-backed logging; full debug detail only for sampled requests
+setup_logging("compile")
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+init_app(app, sample_rates={"/compile": 0.05, "/health": 0.0, "/formatters_status": 0.0})
+init_profiling(app, "compile")
+init_compression(app)
 
 # More explicit CORS configuration
 CORS(app, resources={r"/*": {
@@ -25,46 +40,46 @@ CORS(app, resources={r"/*": {
     "supports_credentials": True
 }})
 
-# Try to import optional formatting libraries
-formatters_available = {
-    'autopep8': False,
-    'jsbeautifier': False,
-    'clang_format': False
-}
+# Compilers and formatters are resolved in the background and cached;
+# COMPILE_WARMUP=0 skips the trivial per-language warmup runs
+COMPILE_WARMUP = os.environ.get("COMPILE_WARMUP", "1") == "1"
+toolchains = ToolchainRegistry()
+
+# Compiled executables/classes of recent submissions, so repeat runs skip the compiler.
+# ARTIFACT_CACHE_DIR keeps them across restarts (one directory per worker);
+# otherwise a temporary directory is used and removed at exit.
+artifact_cache = ArtifactCache(os.environ.get("ARTIFACT_CACHE_DIR") or None,
+                               max_entries=int(os.environ.get("ARTIFACT_CACHE_ENTRIES", "500")))
 
-try:
-    import autopep8
-    formatters_available['autopep8'] = True
-except ImportError:
-    logger.warning("autopep8 not available. Will use fallback formatter for Python.")
+# Multi-file project sessions: source tree and build outputs kept between runs
+project_sessions = ProjectSessionStore(ttl=float(os.environ.get("PROJECT_SESSION_TTL", "1800")))
 
-try:
-    import jsbeautifier
-    formatters_available['jsbeautifier'] = True
-except ImportError:
-    logger.warning("jsbeautifier not available. Will use fallback formatter for JavaScript.")
+# Concurrent /compile requests this worker accepts before the dispatcher spills over
+WORKER_CAPACITY = int(os.environ.get("COMPILE_WORKER_CAPACITY", str(os.cpu_count() or 4)))
+HEARTBEAT_INTERVAL = 5
+_inflight = 0
+_inflight_lock = threading.Lock()
 
-try:
-    import clang.format
-    formatters_available['clang_format'] = True
-except ImportError:
-    logger.warning("clang-format not available. Will use fallback formatter for C/C++.")
+# Default cap on each stdout/stderr field in compact responses
+COMPACT_MAX_OUTPUT_BYTES = 64 * 1024
 
 # Configure supported languages
 LANGUAGE_CONFIG = {
     "python": {
         "file_extension": ".py",
         "command": ["python", "{file}"],
+        "toolchains": ["python"],
         "indentation": {
-            "method": "autopep8" if formatters_available['autopep8'] else "fallback",
+            "method": "autopep8",
             "indent_size": 4
         }
     },
     "javascript": {
         "file_extension": ".js",
         "command": ["node", "{file}"],
+        "toolchains": ["node"],
         "indentation": {
-            "method": "jsbeautifier" if formatters_available['jsbeautifier'] else "fallback",
+            "method": "jsbeautifier",
             "indent_size": 2
         }
     },
@@ -74,6 +89,7 @@ LANGUAGE_CONFIG = {
         "compile_command": ["javac", "-d", "{dir}", "{file}"],
         "run_command": ["java", "-cp", "{dir}", "{class_name}"],
         "requires_specific_name": True,
+        "toolchains": ["javac", "java"],
         "indentation": {
             "method": "fallback",
             "indent_size": 4
@@ -82,18 +98,20 @@ LANGUAGE_CONFIG = {
     "c": {
         "file_extension": ".c",
         "compile_command": ["gcc", "-o", "{executable}", "{file}"],
+        "toolchains": ["gcc"],
         "run_command": ["{executable_path}"],
         "indentation": {
-            "method": "clang_format" if formatters_available['clang_format'] else "fallback",
+            "method": "clang_format",
             "indent_size": 4
         }
     },
     "cpp": {
         "file_extension": ".cpp",
         "compile_command": ["g++", "-o", "{executable}", "{file}"],
+        "toolchains": ["g++"],
         "run_command": ["{executable_path}"],
         "indentation": {
-            "method": "clang_format" if formatters_available['clang_format'] else "fallback",
+            "method": "clang_format",
             "indent_size": 4
         }
     }
@@ -177,15 +195,16 @@ def format_code(code, language, partial=False):
     method = indent_config.get("method")
     indent_size = indent_config.get("indent_size", 4)
     
-    logger.debug(f"Formatting code for language: {language} using method: {method}")
+    logger.debug("Formatting code for language: %s using method: %s", language, method)
     
     try:
-        if not partial:
-            if method == "autopep8" and formatters_available['autopep8']:
-                formatted_code = autopep8.fix_code(code, options={'aggressive': 1})
+        formatter = toolchains.formatter(method) if method != "fallback" else None
+        if not partial and formatter is not None:
+            if method == "autopep8":
+                formatted_code = formatter.fix_code(code, options={'aggressive': 1})
                 return formatted_code
-            elif method == "jsbeautifier" and formatters_available['jsbeautifier']:
-                formatted_code = jsbeautifier.beautify(code, {
+            elif method == "jsbeautifier":
+                formatted_code = formatter.beautify(code, {
                     'indent_size': indent_size,
                     'indent_char': ' ',
                     'preserve_newlines': True,
@@ -193,8 +212,8 @@ def format_code(code, language, partial=False):
                     'keep_array_indentation': False
                 })
                 return formatted_code
-            elif method == "clang_format" and formatters_available['clang_format']:
-                return clang.format.reformat(code, style={
+            elif method == "clang_format":
+                return formatter.reformat(code, style={
                     'BasedOnStyle': 'Google',
                     'IndentWidth': indent_size,
                     'UseTab': 'Never',
@@ -234,19 +253,23 @@ def ensure_java_class_name_matches(code, file_name):
     return code
 
 def run_command(command, cwd=None, timeout=10, stdin_data=None):
-    """Run a shell command and return the output."""
+    """Run a shell command and return the output.
+
+    Without stdin_data the command reads EOF; it never inherits the server's stdin.
+    """
     try:
-        logger.debug(f"Running command: {command} in directory: {cwd}")
+        logger.debug("Running command: %s in directory: %s", command, cwd)
         process = subprocess.Popen(
             command,
             cwd=cwd,
             text=True,
-            stdin=subprocess.PIPE if stdin_data else None,
+            stdin=subprocess.PIPE if stdin_data else subprocess.DEVNULL,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE
         )
         try:
-            stdout, stderr = process.communicate(input=stdin_data, timeout=timeout)
+            with timed_wait("subprocess"):
+                stdout, stderr = process.communicate(input=stdin_data or None, timeout=timeout)
             return {
                 "stdout": stdout,
                 "stderr": stderr,
@@ -268,6 +291,8 @@ def run_command(command, cwd=None, timeout=10, stdin_data=None):
             "returncode": 1
         }
 
+project_builder = ProjectBuilder(run_command)
+
 @app.route('/compile', methods=['OPTIONS'])
 def options_compile():
     response = jsonify({"status": "ok"})
@@ -277,25 +302,55 @@ def options_compile():
     response.headers.add('Access-Control-Allow-Credentials', 'true')
     return response
 
-@app.route('/compile', methods=['POST'])
-def compile_code():
-    data = request.json
-    code = data.get('code', '')
-    language = data.get('language', 'python')
-    stdin = data.get('stdin', '')
-    
-    logger.info(f"Received compilation request for language: {language}")
+def normalize_output(text):
+    """Normalize program output for comparison: ignore trailing whitespace and blank lines."""
+    lines = [line.rstrip() for line in (text or '').replace('\r\n', '\n').split('\n')]
+    while lines and not lines[-1]:
+        lines.pop()
+    return '\n'.join(lines)
+
+def run_test_cases(run_cmd, cwd, test_cases):
+    """Run the program once per test case and compare its output with the expected output."""
+    results = []
+    for index, case in enumerate(test_cases):
+        stdin_data = case.get('input', '')
+        run_result = run_command(run_cmd, cwd=cwd, stdin_data=stdin_data)
+        passed = (run_result["returncode"] == 0 and
+                  normalize_output(run_result["stdout"]) == normalize_output(case.get('expected_output', '')))
+        results.append({
+            "index": index,
+            "passed": passed,
+            "stdout": run_result["stdout"],
+            "stderr": run_result["stderr"],
+            "returncode": run_result["returncode"]
+        })
+    return results
 
+def execute_code(code, language, stdin='', test_cases=None):
+    """Format, compile and run code, returning the /compile response dict.
+
+    When test_cases (a list of {"input", "expected_output"}) are given, the
+    program is compiled once and run against each case; the response then also
+    carries "tests", "tests_passed" and "tests_total".
+    """
     if language not in LANGUAGE_CONFIG:
-        return jsonify({
+        return {
             "success": False,
             "error": f"Unsupported language: {language}",
             "supported_languages": list(LANGUAGE_CONFIG.keys())
-        })
+        }
+
+    missing = [name for name in LANGUAGE_CONFIG[language]["toolchains"] if not toolchains.is_available(name)]
+    if missing:
+        return {
+            "success": False,
+            "phase": "toolchain",
+            "error": f"{language} is not available on this server (missing: {', '.join(missing)})"
+        }
 
     session_id = str(uuid.uuid4())
     temp_dir = tempfile.mkdtemp(prefix=f"compiler_{session_id}_")
-    logger.debug(f"Created temporary directory: {temp_dir}")
+    logger.debug("Created temporary directory: %s", temp_dir)
 
     try:
         lang_config = LANGUAGE_CONFIG[language]
@@ -311,7 +366,7 @@ def compile_code():
             file_name = f"program{file_extension}"
             
         file_path = os.path.join(temp_dir, file_name)
-        logger.debug(f"Writing code to file: {file_path}")
+        logger.debug("Writing code to file: %s", file_path)
 
         with open(file_path, 'w') as f:
             f.write(formatted_code)
@@ -330,7 +385,7 @@ def compile_code():
             class_name = extract_class_name(formatted_code) if language == "java" else None
             
             if language == "java":
-                logger.debug(f"Extracted Java class name: {class_name}")
+                logger.debug("Extracted Java class name: %s", class_name)
 
             compile_cmd = []
             for arg in lang_config["compile_command"]:
@@ -343,17 +398,24 @@ def compile_code():
                 )
                 compile_cmd.append(formatted_arg)
             
-            logger.debug(f"Compile command: {compile_cmd}")
+            logger.debug("Compile command: %s", compile_cmd)
 
-            compile_result = run_command(compile_cmd, cwd=temp_dir)
-            result["compilation"] = compile_result
+            cache_key = ArtifactCache.key(language, formatted_code, lang_config["compile_command"])
+            compile_result = artifact_cache.restore(cache_key, temp_dir)
+            if compile_result is not None:
+                result["compilation"] = dict(compile_result, cached=True)
+            else:
+                compile_result = run_command(compile_cmd, cwd=temp_dir)
+                result["compilation"] = compile_result
+                if compile_result["returncode"] == 0:
+                    artifact_cache.store(cache_key, temp_dir, {file_name}, compile_result)
             
-            logger.debug(f"Compilation result: {compile_result}")
+            logger.debug("Compilation result: %s", Redacted(compile_result))
 
             if compile_result["returncode"] != 0:
                 result["success"] = False
                 result["phase"] = "compilation"
-                return jsonify(result)
+                return result
 
             run_cmd = []
             for arg in lang_config["run_command"]:
@@ -365,48 +427,224 @@ def compile_code():
                     class_name=class_name
                 )
                 run_cmd.append(formatted_arg)
-            
-            logger.debug(f"Run command: {run_cmd}")
-
-            run_result = run_command(run_cmd, cwd=temp_dir, stdin_data=stdin)
-            result["execution"] = run_result
-            result["success"] = run_result["returncode"] == 0
-            result["phase"] = "execution"
-            
-            logger.debug(f"Execution result: {run_result}")
-
         else:
             run_cmd = []
             for arg in lang_config["command"]:
                 formatted_arg = arg.format(file=file_path)
                 run_cmd.append(formatted_arg)
             
-            logger.debug(f"Run command: {run_cmd}")
-
-            run_result = run_command(run_cmd, cwd=temp_dir, stdin_data=stdin)
-            result["execution"] = run_result
-            result["success"] = run_result["returncode"] == 0
-            result["phase"] = "execution"
-            
-            logger.debug(f"Execution result: {run_result}")
+        logger.debug("Run command: %s", run_cmd)
+
+        if test_cases:
+            tests = run_test_cases(run_cmd, temp_dir, test_cases)
+            result["tests"] = tests
+            result["tests_passed"] = sum(1 for t in tests if t["passed"])
+            result["tests_total"] = len(tests)
+            result["success"] = result["tests_passed"] == result["tests_total"]
+            result["phase"] = "tests"
+            logger.debug("Test results: %d/%d passed", result['tests_passed'], result['tests_total'])
+            return result
+
+        run_result = run_command(run_cmd, cwd=temp_dir, stdin_data=stdin)
+        result["execution"] = run_result
+        result["success"] = run_result["returncode"] == 0
+        result["phase"] = "execution"
+        
+        logger.debug("Execution result: %s", Redacted(run_result))
 
-        return jsonify(result)
+        return result
 
     except Exception as e:
         logger.error(f"Error during compilation/execution: {str(e)}")
         logger.error(traceback.format_exc())
-        return jsonify({
+        return {
             "success": False,
             "error": str(e),
             "traceback": traceback.format_exc()
-        })
+        }
     finally:
         try:
-            logger.debug(f"Cleaning up temporary directory: {temp_dir}")
+            logger.debug("Cleaning up temporary directory: %s", temp_dir)
             shutil.rmtree(temp_dir, ignore_errors=True)
         except Exception as e:
             logger.error(f"Error cleaning up: {str(e)}")
 
+def execute_project(files, language, stdin='', test_cases=None, session_id=None, entry=None, archive=None):
+    """Build and run a multi-file project, rebuilding only what changed since the session's last build.
+
+    files maps relative paths to sources (or archive is a base64 zip). Passing
+    the same session_id again reuses that session's object/class files.
+    """
+    if language not in LANGUAGE_CONFIG:
+        return {
+            "success": False,
+            "error": f"Unsupported language: {language}",
+            "supported_languages": list(LANGUAGE_CONFIG.keys())
+        }
+    missing = [name for name in LANGUAGE_CONFIG[language]["toolchains"] if not toolchains.is_available(name)]
+    if missing:
+        return {
+            "success": False,
+            "phase": "toolchain",
+            "error": f"{language} is not available on this server (missing: {', '.join(missing)})"
+        }
+
+    try:
+        files = read_project_files(files, archive)
+        session = project_sessions.get(session_id or uuid.uuid4().hex)
+    except ProjectError as e:
+        return {"success": False, "phase": "project", "error": str(e)}
+
+    with session.lock:
+        try:
+            if session.language != language:
+                session.reset(language)
+            changed, removed = session.sync(files)
+            report = project_builder.build(session, language, changed, removed, entry)
+        except ProjectError as e:
+            return {"success": False, "phase": "project", "error": str(e), "session_id": session.session_id}
+        except Exception as e:
+            logger.error(f"Error during project build: {str(e)}")
+            logger.error(traceback.format_exc())
+            return {"success": False, "error": str(e), "session_id": session.session_id}
+
+        run_cmd = report.pop("run_command", None)
+        result = {"session_id": session.session_id, "build": report}
+        if "compilation" in report:
+            result["compilation"] = report.pop("compilation")
+        logger.debug("Project build: %d changed, %d compiled, %d reused",
+                     len(report["changed"]), len(report["compiled"]), len(report["reused"]))
+
+        if run_cmd is None:
+            result["success"] = False
+            result["phase"] = "compilation"
+            return result
+
+        if test_cases:
+            tests = run_test_cases(run_cmd, session.src_dir, test_cases)
+            result["tests"] = tests
+            result["tests_passed"] = sum(1 for t in tests if t["passed"])
+            result["tests_total"] = len(tests)
+            result["success"] = result["tests_passed"] == result["tests_total"]
+            result["phase"] = "tests"
+            return result
+
+        run_result = run_command(run_cmd, cwd=session.src_dir, stdin_data=stdin)
+        result["execution"] = run_result
+        result["success"] = run_result["returncode"] == 0
+        result["phase"] = "execution"
+        return result
+
+def truncate_output(text, max_bytes):
+    """Cap an output string at max_bytes (UTF-8), returning (text, original byte length or None)."""
+    if not text:
+        return text, None
+    encoded = text.encode('utf-8', errors='replace')
+    if len(encoded) <= max_bytes:
+        return text, None
+    return encoded[:max_bytes].decode('utf-8', errors='ignore'), len(encoded)
+
+def compact_result(result, mode, max_output_bytes=COMPACT_MAX_OUTPUT_BYTES):
+    """Shrink a /compile response for clients that already hold the source.
+
+    The echoed original code is dropped, formatted code is only sent when it
+    differs (as a unified diff when mode is "diff"), and every stdout/stderr is
+    capped with a "truncated" map recording the original sizes.
+    """
+    original = result.pop("original_code", None)
+    formatted = result.pop("formatted_code", None)
+    if formatted is not None:
+        changed = formatted != original
+        result["formatted_changed"] = changed
+        if changed and mode == "diff":
+            result["formatted_diff"] = ''.join(difflib.unified_diff(
+                (original or '').splitlines(keepends=True), formatted.splitlines(keepends=True),
+                fromfile="original", tofile="formatted"
+            ))
+        elif changed:
+            result["formatted_code"] = formatted
+
+    sections = [result.get("compilation"), result.get("execution")] + list(result.get("tests", []))
+    for section in sections:
+        if not section:
+            continue
+        for stream in ("stdout", "stderr"):
+            text, original_size = truncate_output(section.get(stream), max_output_bytes)
+            if original_size is not None:
+                section[stream] = text
+                section.setdefault("truncated", {})[stream] = original_size
+    return result
+
+def parse_compact(value):
+    """Map a "compact" flag from the body or query string to None, "full" or "diff"; ValueError otherwise."""
+    if isinstance(value, str):
+        value = value.strip().lower()
+    if value in (None, False, "", "0", "false", "no", "off"):
+        return None
+    if value in (True, "1", "true", "yes", "on", "full"):
+        return "full"
+    if value == "diff":
+        return "diff"
+    raise ValueError("compact must be true, false or \"diff\"")
+
+def parse_max_output_bytes(value):
+    """Validate a "max_output_bytes" override; ValueError unless it is a positive integer."""
+    if value is None:
+        return COMPACT_MAX_OUTPUT_BYTES
+    if isinstance(value, bool) or not isinstance(value, (int, str)):
+        raise ValueError("max_output_bytes must be a positive integer")
+    try:
+        max_output_bytes = int(value)
+    except ValueError:
+        raise ValueError("max_output_bytes must be a positive integer")
+    if max_output_bytes <= 0:
+        raise ValueError("max_output_bytes must be a positive integer")
+    return max_output_bytes
+
+@app.route('/compile', methods=['POST'])
+def compile_code():
+    """Compile and run code.
+
+    Multi-file projects send "files" ({path: source}) or "archive" (base64
+    zip) instead of "code", plus optional "entry" and "session_id"; reusing a
+    session_id rebuilds only the files that changed.
+
+    Set "compact": true (or "diff") in the body or ?compact=1 for a compact
+    response; "max_output_bytes" overrides the output cap. Invalid values for
+    either are rejected with a 400. Large responses
+    are gzip/brotli-compressed per Accept-Encoding, and MessagePack is used
+    when requested with Accept: application/msgpack.
+    """
+    data = request.json
+    code = data.get('code', '')
+    language = data.get('language', 'python')
+    stdin = data.get('stdin', '')
+    test_cases = data.get('test_cases')
+    try:
+        compact = parse_compact(data['compact'] if 'compact' in data else request.args.get('compact'))
+        max_output_bytes = parse_max_output_bytes(data.get('max_output_bytes'))
+    except ValueError as e:
+        return jsonify({"success": False, "error": str(e)}), 400
+    
+    logger.info("Received compilation request for language: %s", language)
+
+    global _inflight
+    with _inflight_lock:
+        _inflight += 1
+    try:
+        if data.get('files') or data.get('archive'):
+            result = execute_project(data.get('files'), language, stdin, test_cases,
+                                     session_id=data.get('session_id'), entry=data.get('entry'),
+                                     archive=data.get('archive'))
+        else:
+            result = execute_code(code, language, stdin, test_cases)
+    finally:
+        with _inflight_lock:
+            _inflight -= 1
+    if compact:
+        result = compact_result(result, compact, max_output_bytes)
+    return encode_response(result)
+
 @app.route('/indentation_test', methods=['POST'])
 def test_indentation():
     """Endpoint to format entire code block."""
@@ -426,13 +664,13 @@ def test_indentation():
             "success": True,
             "original_code": code,
             "formatted_code": formatted_code,
-            "formatters_available": formatters_available
+            "formatters_available": toolchains.formatters_available()
         })
     except Exception as e:
         return jsonify({
             "success": False,
             "error": str(e),
-            "formatters_available": formatters_available
+            "formatters_available": toolchains.formatters_available()
         })
 
 @app.route('/indent_line', methods=['POST'])
@@ -462,12 +700,29 @@ def indent_line():
 
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "healthy", "message": "Flask server is running correctly"})
+    status = toolchains.status()
+    return jsonify({
+        "status": "healthy",
+        "message": "Flask server is running correctly",
+        "inflight": _inflight,
+        "capacity": WORKER_CAPACITY,
+        "artifact_cache": artifact_cache.stats(),
+        "project_sessions": project_sessions.stats(),
+        "toolchains_ready": status["ready"],
+        "startup_ms": status["startup_ms"],
+        "languages": {
+            language: all(status["toolchains"][name]["available"] for name in config["toolchains"])
+            for language, config in LANGUAGE_CONFIG.items()
+        } if status["ready"] else None
+    })
 
 @app.route('/formatters_status', methods=['GET'])
 def formatters_status():
+    status = toolchains.status()
     return jsonify({
-        "formatters_available": formatters_available,
+        "formatters_available": {name: bool(info["available"]) for name, info in status["formatters"].items()},
+        "encoders_available": encoders_available,
+        "toolchains": status,
         "status": "ok"
     })
 
@@ -560,5 +815,55 @@ return 0;
     
     return jsonify(results)
 
+# Trivial programs compiled and run once at startup to warm compiler caches
+WARMUP_PROGRAMS = {
+    "python": 'print("ok")\n',
+    "javascript": 'console.log("ok");\n',
+    "java": 'public class Main {\n    public static void main(String[] args) {\n        System.out.println("ok");\n    }\n}\n',
+    "c": '#include <stdio.h>\nint main() {\n    printf("ok\\n");\n    return 0;\n}\n',
+    "cpp": '#include <iostream>\nint main() {\n    std::cout << "ok" << std::endl;\n    return 0;\n}\n'
+}
+
+def warmup_language(language):
+    result = execute_code(WARMUP_PROGRAMS[language], language)
+    if result.get("phase") == "toolchain":
+        return None
+    return result.get("success", False)
+
+toolchains.start(warmup=warmup_language if COMPILE_WARMUP else None, languages=list(WARMUP_PROGRAMS))
+
+def _dispatcher_post(dispatcher_url, path, payload):
+    try:
+        requests.post(f"{dispatcher_url.rstrip('/')}{path}", json=payload, timeout=3)
+        return True
+    except requests.exceptions.RequestException as e:
+        logger.warning("Dispatcher %s unreachable: %s", dispatcher_url, e)
+        return False
+
+def register_with_dispatcher(dispatcher_url, worker_url):
+    """Register this worker and keep sending heartbeats with its load and cache stats."""
+    def heartbeat():
+        while True:
+            _dispatcher_post(dispatcher_url, "/workers/heartbeat", {
+                "url": worker_url,
+                "capacity": WORKER_CAPACITY,
+                "inflight": _inflight,
+                "artifact_cache": artifact_cache.stats()
+            })
+            time.sleep(HEARTBEAT_INTERVAL)
+
+    threading.Thread(target=heartbeat, daemon=True, name="dispatcher-heartbeat").start()
+    # Stop receiving new jobs on a clean shutdown
+    atexit.register(_dispatcher_post, dispatcher_url, "/workers/deregister", {"url": worker_url})
+
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5002, debug=True)
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Compile service / compile worker")
+    parser.add_argument("--port", type=int, default=5002)
+    parser.add_argument("--dispatcher", default=os.environ.get("DISPATCHER_URL"),
+                        help="dispatcher base URL to register with, e.g. http://localhost:5003")
+    parser.add_argument("--advertise", help="URL the dispatcher should use to reach this worker")
+    args = parser.parse_args()
+    if args.dispatcher:
+        register_with_dispatcher(args.dispatcher, args.advertise or f"http://127.0.0.1:{args.port}")
+    # The reloader would register a second, short-lived worker process
+    app.run(host='0.0.0.0', port=args.port, debug=True, use_reloader=not args.dispatcher)
\ No newline at end of file
@@ -0,0 +1,352 @@
+"""Dispatcher that spreads /compile jobs over several compile workers.
+
+Workers (compile.py --port N --dispatcher http://localhost:5003) register by
+heartbeat. Jobs are routed by consistent hashing on the source hash, so a
+repeat run of the same code lands on the worker that already holds its
+compiled artifact; when that worker is at capacity the job spills over to the
+next worker on the ring. Unhealthy workers leave the ring until they recover,
+and drained workers take no new jobs. To try it on one machine:
+
+    python dispatcher.py --spawn 4
+    COMPILE_SERVICE_URL=http://localhost:5003/compile python test_cors.py
+"""
+import argparse
+import bisect
+import hashlib
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from typing import Dict, Any, List, Optional
+
+import requests
+from flask import Flask, request, jsonify, Response
+from flask_cors import CORS
+
+from log_config import setup_logging, init_app, trace_headers
+
+setup_logging("dispatcher")
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+init_app(app, sample_rates={"/compile": 0.05, "/health": 0.0, "/workers/heartbeat": 0.0})
+
+CORS(app, resources={r"/*": {
+    "origins": "http://localhost:3000",
+    "methods": ["GET", "POST", "OPTIONS"],
+    "allow_headers": ["Content-Type", "Authorization"],
+    "supports_credentials": True
+}})
+
+VIRTUAL_NODES = 100
+HEALTH_INTERVAL = 5
+# A worker missing heartbeats this long, or failing this many checks, leaves the ring
+HEARTBEAT_TIMEOUT = 15
+MAX_HEALTH_FAILURES = 2
+FORWARD_TIMEOUT = 120
+# Forwarded request/response headers
+FORWARD_REQUEST_HEADERS = ("Content-Type", "Accept", "Accept-Encoding")
+FORWARD_RESPONSE_HEADERS = ("Content-Type", "Content-Encoding", "Vary")
+
+
+class HashRing:
+    """Consistent-hash ring with virtual nodes."""
+
+    def __init__(self, virtual_nodes: int = VIRTUAL_NODES):
+        self.virtual_nodes = virtual_nodes
+        self.points = []
+        self.owners = {}
+
+    @staticmethod
+    def _hash(value: str) -> int:
+        return int(hashlib.md5(value.encode()).hexdigest()[:16], 16)
+
+    def add(self, node: str):
+        for i in range(self.virtual_nodes):
+            point = self._hash(f"{node}#{i}")
+            if point not in self.owners:
+                bisect.insort(self.points, point)
+                self.owners[point] = node
+
+    def remove(self, node: str):
+        self.points = [p for p in self.points if self.owners[p] != node]
+        self.owners = {p: n for p, n in self.owners.items() if n != node}
+
+    def preference_list(self, key: str) -> List[str]:
+        """Distinct nodes in ring order starting at the key's position."""
+        if not self.points:
+            return []
+        start = bisect.bisect(self.points, self._hash(key))
+        nodes = []
+        for i in range(len(self.points)):
+            node = self.owners[self.points[(start + i) % len(self.points)]]
+            if node not in nodes:
+                nodes.append(node)
+        return nodes
+
+
+class WorkerRegistry:
+    """Registered workers, their health and load, and the ring of routable ones."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.workers = {}
+        self.ring = HashRing()
+        self.stats = {"routed": 0, "affinity": 0, "spillover": 0, "retried": 0, "no_workers": 0}
+
+    def _routable(self, worker) -> bool:
+        return worker["healthy"] and not worker["draining"]
+
+    def _sync_ring(self, url: str, was_routable: bool):
+        is_routable = self._routable(self.workers[url]) if url in self.workers else False
+        if is_routable and not was_routable:
+            self.ring.add(url)
+            logger.info("Worker %s joined the ring", url)
+        elif was_routable and not is_routable:
+            self.ring.remove(url)
+            logger.info("Worker %s left the ring", url)
+
+    def heartbeat(self, url: str, capacity: int, inflight: int, cache: Optional[Dict[str, Any]]):
+        with self.lock:
+            worker = self.workers.get(url)
+            was_routable = worker is not None and self._routable(worker)
+            if worker is None:
+                worker = self.workers[url] = {"url": url, "healthy": True, "draining": False, "inflight": 0,
+                                              "failures": 0, "routed": 0, "registered": time.time()}
+                logger.info("Worker %s registered with capacity %d", url, capacity)
+            worker.update(capacity=max(1, capacity), reported_inflight=inflight, artifact_cache=cache,
+                          last_heartbeat=time.monotonic(), healthy=True, failures=0)
+            self._sync_ring(url, was_routable)
+
+    def deregister(self, url: str) -> bool:
+        with self.lock:
+            worker = self.workers.pop(url, None)
+            if worker is None:
+                return False
+            if self._routable(worker):
+                self.ring.remove(url)
+            logger.info("Worker %s deregistered", url)
+            return True
+
+    def set_draining(self, url: str, draining: bool) -> bool:
+        with self.lock:
+            worker = self.workers.get(url)
+            if worker is None:
+                return False
+            was_routable = self._routable(worker)
+            worker["draining"] = draining
+            self._sync_ring(url, was_routable)
+            return True
+
+    def mark_health(self, url: str, healthy: bool, immediate: bool = False):
+        """Record a health check; a worker leaves the ring after repeated failures, or at once if immediate."""
+        with self.lock:
+            worker = self.workers.get(url)
+            if worker is None:
+                return
+            was_routable = self._routable(worker)
+            if healthy:
+                worker["failures"] = 0
+                worker["healthy"] = True
+            else:
+                worker["failures"] += 1
+                if immediate or worker["failures"] >= MAX_HEALTH_FAILURES:
+                    worker["healthy"] = False
+            self._sync_ring(url, was_routable)
+
+    def candidates(self, key: str) -> List[str]:
+        """Workers to try for a key: ring order, but saturated workers after the rest."""
+        with self.lock:
+            order = self.ring.preference_list(key)
+            if not order:
+                self.stats["no_workers"] += 1
+                return []
+            free = [url for url in order if self.workers[url]["inflight"] < self.workers[url]["capacity"]]
+            if not free:
+                # Everyone is saturated: queue on the least loaded worker rather than fail
+                free = [min(order, key=lambda url: self.workers[url]["inflight"] / self.workers[url]["capacity"])]
+            self.stats["routed"] += 1
+            if free[0] == order[0]:
+                self.stats["affinity"] += 1
+            else:
+                self.stats["spillover"] += 1
+            return free + [url for url in order if url not in free]
+
+    def acquire(self, url: str) -> bool:
+        with self.lock:
+            worker = self.workers.get(url)
+            if worker is None:
+                return False
+            worker["inflight"] += 1
+            worker["routed"] += 1
+            return True
+
+    def release(self, url: str):
+        with self.lock:
+            worker = self.workers.get(url)
+            if worker is not None:
+                worker["inflight"] -= 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        with self.lock:
+            workers = []
+            for worker in self.workers.values():
+                info = {k: v for k, v in worker.items() if k != "last_heartbeat"}
+                info["heartbeat_age_s"] = round(now - worker["last_heartbeat"], 1)
+                info["routable"] = self._routable(worker)
+                workers.append(info)
+            return {"workers": workers, "stats": dict(self.stats)}
+
+
+registry = WorkerRegistry()
+session = requests.Session()
+
+
+def health_loop():
+    """Probe every worker's /health and drop workers whose heartbeats stopped."""
+    while True:
+        time.sleep(HEALTH_INTERVAL)
+        now = time.monotonic()
+        for worker in registry.snapshot()["workers"]:
+            url = worker["url"]
+            if worker["heartbeat_age_s"] > HEARTBEAT_TIMEOUT:
+                logger.warning("Worker %s missed heartbeats for %.0fs", url, worker["heartbeat_age_s"])
+                registry.mark_health(url, False)
+                continue
+            try:
+                healthy = session.get(f"{url}/health", timeout=3).ok
+            except requests.exceptions.RequestException:
+                healthy = False
+            registry.mark_health(url, healthy)
+        logger.debug("Health check pass took %.1fms", (time.monotonic() - now) * 1000)
+
+
+def routing_key(data: Dict[str, Any]) -> str:
+    # Project sessions live on one worker's disk, so every build of a session goes there
+    # (dispatch_compile assigns a session_id to projects that arrive without one)
+    if data.get('session_id'):
+        return f"session\0{data['session_id']}"
+    code = '\n'.join(line.rstrip() for line in (data.get('code') or '').strip().split('\n'))
+    return hashlib.sha256(f"{data.get('language', 'python')}\0{code}".encode()).hexdigest()
+
+
+@app.route('/compile', methods=['POST'])
+def dispatch_compile():
+    body = request.get_data()
+    try:
+        data = json.loads(body or b"{}")
+    except ValueError:
+        return jsonify({"success": False, "error": "Request body must be JSON"}), 400
+    if (data.get('files') or data.get('archive')) and not data.get('session_id'):
+        # Pick the session here so it is routed by its own key rather than all sharing the empty-code hash;
+        # the worker returns it and the client's next build of the project lands on the same worker
+        data['session_id'] = uuid.uuid4().hex
+        body = json.dumps(data).encode()
+
+    headers = {name: request.headers[name] for name in FORWARD_REQUEST_HEADERS if name in request.headers}
+    # Otherwise requests adds its own Accept-Encoding and the worker compresses for a client that cannot decode
+    headers.setdefault("Accept-Encoding", "identity")
+    headers.update(trace_headers())
+    candidates = registry.candidates(routing_key(data))
+    if not candidates:
+        return jsonify({"success": False, "error": "No compile workers available"}), 503
+
+    for url in candidates:
+        if not registry.acquire(url):
+            continue
+        try:
+            # stream=True so the worker's (possibly compressed) body is passed through untouched
+            upstream = session.post(f"{url}/compile", data=body, headers=headers, params=request.args,
+                                    timeout=FORWARD_TIMEOUT, stream=True)
+            content = upstream.raw.read(decode_content=False)
+        except requests.exceptions.ConnectionError as e:
+            # The worker is gone; take it out of rotation and try the next one on the ring
+            logger.warning("Worker %s unreachable: %s", url, e)
+            registry.mark_health(url, False, immediate=True)
+            with registry.lock:
+                registry.stats["retried"] += 1
+            continue
+        except requests.exceptions.RequestException as e:
+            logger.error("Forwarding to %s failed: %s", url, e)
+            return jsonify({"success": False, "error": f"Compile worker error: {str(e)}"}), 502
+        finally:
+            registry.release(url)
+
+        response = Response(content, status=upstream.status_code)
+        for name in FORWARD_RESPONSE_HEADERS:
+            if name in upstream.headers:
+                response.headers[name] = upstream.headers[name]
+        response.headers["X-Compile-Worker"] = url
+        return response
+
+    return jsonify({"success": False, "error": "No compile workers reachable"}), 503
+
+
+@app.route('/workers/heartbeat', methods=['POST'])
+def worker_heartbeat():
+    data = request.json or {}
+    if not data.get("url"):
+        return jsonify({"success": False, "error": "url is required"}), 400
+    registry.heartbeat(data["url"], int(data.get("capacity", 1)), int(data.get("inflight", 0)),
+                       data.get("artifact_cache"))
+    return jsonify({"success": True})
+
+
+@app.route('/workers/deregister', methods=['POST'])
+def worker_deregister():
+    data = request.json or {}
+    return jsonify({"success": registry.deregister(data.get("url", ""))})
+
+
+@app.route('/workers/drain', methods=['POST'])
+def worker_drain():
+    """Stop (or with "draining": false, resume) routing new jobs to a worker; in-flight jobs finish."""
+    data = request.json or {}
+    if not registry.set_draining(data.get("url", ""), bool(data.get("draining", True))):
+        return jsonify({"success": False, "error": f"Unknown worker: {data.get('url')}"}), 404
+    return jsonify({"success": True})
+
+
+@app.route('/workers', methods=['GET'])
+def list_workers():
+    return jsonify(registry.snapshot())
+
+
+@app.route('/health', methods=['GET'])
+def health_check():
+    snapshot = registry.snapshot()
+    routable = sum(1 for w in snapshot["workers"] if w["routable"])
+    return jsonify({
+        "status": "healthy" if routable else "degraded",
+        "workers": len(snapshot["workers"]),
+        "routable_workers": routable,
+        "stats": snapshot["stats"]
+    }), 200 if routable else 503
+
+
+def spawn_workers(count: int, first_port: int, dispatcher_url: str) -> List[subprocess.Popen]:
+    """Start local compile workers that register with this dispatcher."""
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "compile.py")
+    return [subprocess.Popen([sys.executable, script, "--port", str(first_port + i), "--dispatcher", dispatcher_url])
+            for i in range(count)]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile job dispatcher")
+    parser.add_argument("--port", type=int, default=5003)
+    parser.add_argument("--spawn", type=int, default=0, help="start this many local compile workers")
+    parser.add_argument("--worker-port", type=int, default=5010, help="port of the first spawned worker")
+    args = parser.parse_args()
+
+    threading.Thread(target=health_loop, daemon=True, name="health-check").start()
+    children = spawn_workers(args.spawn, args.worker_port, f"http://127.0.0.1:{args.port}") if args.spawn else []
+    try:
+        app.run(host='0.0.0.0', port=args.port, threaded=True)
+    finally:
+        for child in children:
+            child.terminate()
@@ -0,0 +1,131 @@
+import logging
+from typing import Dict, Any, List, Optional
+
+import requests
+
+from log_config import trace_headers
+from profiling import timed_wait
+
+logger = logging.getLogger(__name__)
+
+# Cap on how much failing output is quoted back in a deterministic review
+MAX_REVIEW_OUTPUT_CHARS = 500
+
+
+class HybridGrader:
+    """Grade by running the submission against test cases first.
+
+    The numeric grade is the share of passing test cases, computed by the local
+    compile service, so it is reproducible. The LLM is only asked for the
+    qualitative review, and is skipped entirely when the code does not compile
+    or fails every test case.
+    """
+
+    def __init__(self, evaluator, compile_url: str, timeout: float = 120):
+        self.evaluator = evaluator
+        self.compile_url = compile_url
+        self.timeout = timeout
+
+    def grade(self, code: str, language: str, question: Optional[str] = None,
+              test_cases: Optional[List[Dict[str, str]]] = None) -> Dict[str, Any]:
+        if not test_cases:
+            return self.evaluator.evaluate_code(code, language, question)
+
+        try:
+            with timed_wait("compile"):
+                response = requests.post(
+                    self.compile_url,
+                    json={"code": code, "language": language, "test_cases": test_cases},
+                    headers=trace_headers(),
+                    timeout=self.timeout
+                )
+            response.raise_for_status()
+            execution = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            # Without the compile service we can still give an LLM-only grade
+            logger.error(f"Compile service unavailable, falling back to LLM grading: {str(e)}")
+            return self.evaluator.evaluate_code(code, language, question)
+
+        return self.grade_execution(code, language, question, execution)
+
+    @staticmethod
+    def needs_review(execution: Dict[str, Any]) -> bool:
+        """Whether grade_execution uses an LLM review for this /compile result.
+
+        Code that failed to compile, could not run or failed every test case gets
+        a deterministic 0 without one.
+        """
+        return "tests" in execution and execution["tests_passed"] > 0
+
+    def grade_execution(self, code: str, language: str, question: Optional[str],
+                        execution: Dict[str, Any], review: Optional[Dict[str, Any]] = None,
+                        use_llm: bool = True) -> Dict[str, Any]:
+        """Combine a /compile result (run with test cases) and an optional LLM review into a grade.
+
+        If ``review`` is None it is fetched from the evaluator when the execution
+        result warrants one; with ``use_llm`` False the grade is test-based only.
+        """
+        if "tests" not in execution:
+            if execution.get("phase") == "compilation":
+                stderr = execution.get("compilation", {}).get("stderr", "")
+                message = "The code failed to compile, so no test cases were run."
+            else:
+                stderr = execution.get("error", "")
+                message = "The code could not be executed."
+            return self._deterministic_result(0.0, execution, f"{message}\n\n{stderr[:MAX_REVIEW_OUTPUT_CHARS]}".strip())
+
+        passed = execution["tests_passed"]
+        total = execution["tests_total"]
+        correctness = round(10.0 * passed / total, 1) if total else 0.0
+
+        if passed == 0:
+            failures = self._describe_failures(execution["tests"])
+            return self._deterministic_result(0.0, execution, f"The code failed all {total} test case(s).\n\n{failures}")
+
+        summary = f"Passed {passed}/{total} test case(s)."
+        if not use_llm:
+            return self._deterministic_result(correctness, execution, summary)
+
+        if review is None:
+            review = self.evaluator.evaluate_code(code, language, question)
+
+        if review.get("success"):
+            review_text = f"{summary}\n\n{review['review']}"
+        else:
+            review_text = f"{summary}\n\nQualitative review unavailable: {review.get('error', 'unknown error')}"
+
+        return {
+            "success": True,
+            "evaluation": review_text,
+            "grade": correctness,
+            "correctness_grade": correctness,
+            "quality_grade": review.get("grade") if review.get("success") else None,
+            "result": "success",
+            "review": review_text,
+            "tests_passed": passed,
+            "tests_total": total,
+            "llm_used": True
+        }
+
+    def _deterministic_result(self, grade: float, execution: Dict[str, Any], review: str) -> Dict[str, Any]:
+        return {
+            "success": True,
+            "evaluation": review,
+            "grade": grade,
+            "correctness_grade": grade,
+            "quality_grade": None,
+            "result": "success",
+            "review": review,
+            "tests_passed": execution.get("tests_passed", 0),
+            "tests_total": execution.get("tests_total", 0),
+            "llm_used": False
+        }
+
+    def _describe_failures(self, tests: List[Dict[str, Any]], limit: int = 3) -> str:
+        lines = []
+        for test in tests[:limit]:
+            detail = test.get("stderr") or test.get("stdout") or "(no output)"
+            lines.append(f"* Test {test['index'] + 1}: exit code {test['returncode']}, output: {detail[:MAX_REVIEW_OUTPUT_CHARS].strip()}")
+        if len(tests) > limit:
+            lines.append(f"* ... and {len(tests) - limit} more")
+        return '\n'.join(lines)
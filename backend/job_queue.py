@@ -0,0 +1,296 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+import logging
+from typing import Dict, Any, Callable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class JobQueue:
+    """Durable SQLite-backed job queue with leases for at-least-once delivery.
+
+    A claimed job is leased to a worker for ``lease_seconds`` and the worker
+    renews the lease while it is still processing. If the worker dies (or the
+    process restarts) before completing it, the lease expires and the job is
+    handed out again - unless it has used all its attempts, in which case it
+    is marked failed so a job that crashes its worker cannot loop forever.
+    """
+
+    def __init__(self, db_path: str, lease_seconds: float = 120.0, max_attempts: int = 3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self.lock = threading.Lock()
+        self.finished = threading.Condition(self.lock)
+        self.available = threading.Condition(self.lock)
+        # Bumped whenever a job becomes claimable, so idle workers do not miss a wake-up
+        self.enqueue_seq = 0
+        self.finish_seq = 0
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA busy_timeout=5000")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                batch_id TEXT,
+                lease_expires REAL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at);
+            CREATE INDEX IF NOT EXISTS idx_jobs_batch ON jobs (batch_id);
+        """)
+
+    def enqueue(self, kind: str, payload: Dict[str, Any], batch_id: Optional[str] = None) -> str:
+        return self.enqueue_many(kind, [payload], batch_id)[0]
+
+    def enqueue_many(self, kind: str, payloads: List[Dict[str, Any]], batch_id: Optional[str] = None) -> List[str]:
+        now = time.time()
+        rows = [(str(uuid.uuid4()), kind, json.dumps(p), "queued", batch_id, now, now) for p in payloads]
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            self.conn.executemany(
+                "INSERT INTO jobs (id, kind, payload, status, batch_id, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            self.conn.execute("COMMIT")
+            self.enqueue_seq += 1
+            self.available.notify_all()
+        return [row[0] for row in rows]
+
+    def wait_for_jobs(self, seen_seq: int, timeout: float):
+        """Sleep until a job is enqueued after seen_seq was read, or the timeout expires.
+
+        Jobs enqueued by other processes sharing the database are only noticed
+        when the timeout expires.
+        """
+        with self.lock:
+            if self.enqueue_seq == seen_seq:
+                self.available.wait(timeout)
+
+    def claim(self) -> Optional[Dict[str, Any]]:
+        """Lease the oldest queued job (or one whose lease has expired)."""
+        now = time.time()
+        with self.lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                # Jobs whose worker died on their last attempt are not handed out again
+                abandoned = self.conn.execute(
+                    "UPDATE jobs SET status = 'failed', error = ?, lease_expires = NULL, updated_at = ? "
+                    "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                    (f"Lease expired on attempt {self.max_attempts}; worker did not finish the job",
+                     now, now, self.max_attempts)
+                ).rowcount
+                if abandoned:
+                    logger.warning("Marked %d abandoned job(s) as failed", abandoned)
+                    self.finish_seq += 1
+                    self.finished.notify_all()
+                row = self.conn.execute(
+                    "SELECT * FROM jobs WHERE status = 'queued' "
+                    "OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now,)
+                ).fetchone()
+                if row is None:
+                    self.conn.execute("COMMIT")
+                    return None
+                self.conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, "
+                    "lease_expires = ?, updated_at = ? WHERE id = ?",
+                    (now + self.lease_seconds, now, row["id"])
+                )
+                self.conn.execute("COMMIT")
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+        job = self._row_to_job(row)
+        job["attempts"] += 1
+        return job
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a job that no worker has claimed yet; False if it already started."""
+        with self.lock:
+            cancelled = self.conn.execute(
+                "UPDATE jobs SET status = 'cancelled', updated_at = ? WHERE id = ? AND status = 'queued'",
+                (time.time(), job_id)
+            ).rowcount == 1
+            if cancelled:
+                self.finish_seq += 1
+                self.finished.notify_all()
+            return cancelled
+
+    def renew(self, job_id: str) -> bool:
+        """Extend a running job's lease; False if the job is no longer running."""
+        now = time.time()
+        with self.lock:
+            return self.conn.execute(
+                "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND status = 'running'",
+                (now + self.lease_seconds, now, job_id)
+            ).rowcount == 1
+
+    def complete(self, job_id: str, result: Dict[str, Any]):
+        self._finish(job_id, "done", result=result)
+
+    def fail(self, job_id: str, error: str, result: Optional[Dict[str, Any]] = None, retry: bool = True):
+        """Requeue the job if it has attempts left, otherwise mark it failed."""
+        job = self.get(job_id)
+        if retry and job and job["attempts"] < self.max_attempts:
+            self._finish(job_id, "queued", error=error, notify=False)
+        else:
+            self._finish(job_id, "failed", result=result, error=error)
+
+    def _finish(self, job_id: str, status: str, result: Optional[Dict[str, Any]] = None,
+                error: Optional[str] = None, notify: bool = True):
+        with self.lock:
+            self.conn.execute(
+                "UPDATE jobs SET status = ?, result = ?, error = ?, lease_expires = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+            )
+            if notify:
+                self.finish_seq += 1
+                self.finished.notify_all()
+            if status == "queued":
+                self.enqueue_seq += 1
+                self.available.notify_all()
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self.lock:
+            row = self.conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row else None
+
+    def wait_for(self, job_id: str, timeout: float) -> Optional[Dict[str, Any]]:
+        """Block until the job is done/failed/cancelled or the timeout expires; return its latest state."""
+        deadline = time.time() + timeout
+        while True:
+            seen_seq = self.finish_seq
+            job = self.get(job_id)
+            if job is None or job["status"] in ("done", "failed", "cancelled"):
+                return job
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                return job
+            # Other processes sharing the database cannot notify us, so wake up periodically.
+            with self.lock:
+                if self.finish_seq == seen_seq:
+                    self.finished.wait(min(remaining, 0.5))
+
+    def batch_status(self, batch_id: str) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT status, COUNT(*) AS n FROM jobs WHERE batch_id = ? GROUP BY status",
+                (batch_id,)
+            ).fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def counts(self) -> Dict[str, int]:
+        with self.lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+    def _row_to_job(self, row) -> Dict[str, Any]:
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "payload": json.loads(row["payload"]),
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "batch_id": row["batch_id"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+
+class WorkerPool:
+    """Fixed pool of threads that drain a JobQueue using per-kind handlers.
+
+    A handler returns a result dict. A result with ``success`` set to False is
+    treated as a failure and retried unless it also sets ``retryable`` to False.
+    Exceptions raised by the handler are always retried. While a handler runs,
+    its job's lease is renewed every third of the lease period.
+    """
+
+    def __init__(self, queue: JobQueue, handlers: Dict[str, Callable[[Dict[str, Any]], Dict[str, Any]]],
+                 num_workers: int = 4, poll_interval: float = 0.5):
+        self.queue = queue
+        self.handlers = handlers
+        self.num_workers = num_workers
+        self.poll_interval = poll_interval
+        self.threads = []
+        self.stop_event = threading.Event()
+        self.start_lock = threading.Lock()
+
+    def start(self):
+        with self.start_lock:
+            if self.threads:
+                return
+            for i in range(self.num_workers):
+                thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self.threads.append(thread)
+            logger.info(f"Started {self.num_workers} job workers")
+
+    def stop(self):
+        self.stop_event.set()
+        with self.queue.lock:
+            self.queue.available.notify_all()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            seen_seq = self.queue.enqueue_seq
+            try:
+                job = self.queue.claim()
+            except Exception as e:
+                logger.error(f"Failed to claim job: {str(e)}")
+                job = None
+            if job is None:
+                # Woken by enqueue; the poll interval only covers other processes' jobs
+                self.queue.wait_for_jobs(seen_seq, self.poll_interval)
+                continue
+            done = threading.Event()
+            renewer = threading.Thread(target=self._renew_lease, args=(job["id"], done),
+                                       name=f"{threading.current_thread().name}-lease", daemon=True)
+            renewer.start()
+            try:
+                self._process(job)
+            finally:
+                done.set()
+                renewer.join()
+
+    def _renew_lease(self, job_id: str, done: threading.Event):
+        while not done.wait(self.queue.lease_seconds / 3):
+            try:
+                if not self.queue.renew(job_id):
+                    return
+            except Exception as e:
+                logger.error(f"Failed to renew lease for job {job_id}: {str(e)}")
+
+    def _process(self, job: Dict[str, Any]):
+        handler = self.handlers.get(job["kind"])
+        if handler is None:
+            self.queue.fail(job["id"], f"No handler for job kind: {job['kind']}")
+            return
+        try:
+            result = handler(job["payload"])
+        except Exception as e:
+            logger.error(f"Job {job['id']} raised: {str(e)}")
+            self.queue.fail(job["id"], str(e))
+            return
+        if isinstance(result, dict) and result.get("success") is False:
+            self.queue.fail(job["id"], result.get("error", "Job failed"), result=result,
+                            retry=result.get("retryable", True))
+        else:
+            self.queue.complete(job["id"], result)
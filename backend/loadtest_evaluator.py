@@ -0,0 +1,132 @@
+"""Load driver for CodeEvaluator against the local OpenRouter mock.
+
+Starts mock_openrouter.py in-process (or targets --url) and runs the real
+evaluator code path - router, prompt building, HTML conversion and grade
+extraction - at each concurrency level, reporting throughput and tail latency:
+
+    python loadtest_evaluator.py --concurrency 1,8,32,64 --requests 200 --latency lognormal:800:0.5
+"""
+import json
+import logging
+import os
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Keep the evaluator's own logging out of the report
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+
+from werkzeug.serving import make_server
+
+import mock_openrouter
+from code_evaluator import CodeEvaluator, OPENROUTER_API_KEY, OPENROUTER_ROUTES
+from log_config import setup_logging
+
+setup_logging("loadtest")
+# The in-process mock would otherwise log every request through the same queue listener
+logging.getLogger("werkzeug").setLevel(logging.ERROR)
+
+SAMPLE_CODE = '''def fizzbuzz(n):
+    # classic warm-up
+    for i in range(1, n + 1):
+        if i % 15 == 0:
+            print("FizzBuzz")
+        elif i % 3 == 0:
+            print("Fizz")
+        elif i % 5 == 0:
+            print("Buzz")
+        else:
+            print(i)
+
+fizzbuzz(int(input()))
+'''
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))]
+
+
+def start_mock(port: int):
+    server = make_server("127.0.0.1", port, mock_openrouter.app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def run_level(api_url: str, concurrency: int, total: int, hedge: bool):
+    routes = OPENROUTER_ROUTES if hedge else OPENROUTER_ROUTES[:1]
+    evaluator = CodeEvaluator(OPENROUTER_API_KEY, routes[0]["model"], routes, api_url=api_url,
+                              max_workers=concurrency * len(routes))
+
+    latencies = []
+    outcomes = {"success": 0, "error": 0, "grade_extracted": 0, "grade_heuristic": 0}
+    lock = threading.Lock()
+
+    def one(_):
+        start = time.monotonic()
+        result = evaluator.evaluate_code(SAMPLE_CODE, "python", "Print FizzBuzz up to n.")
+        elapsed = time.monotonic() - start
+        with lock:
+            latencies.append(elapsed)
+            if result.get("success"):
+                outcomes["success"] += 1
+                if evaluator._extract_grade(result["evaluation"]) is not None:
+                    outcomes["grade_extracted"] += 1
+                else:
+                    outcomes["grade_heuristic"] += 1
+            else:
+                outcomes["error"] += 1
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, range(total)))
+    wall = time.monotonic() - start
+
+    return {
+        "concurrency": concurrency,
+        "requests": total,
+        "throughput_rps": round(total / wall, 2),
+        "latency_p50_ms": round(percentile(latencies, 50) * 1000, 1),
+        "latency_p95_ms": round(percentile(latencies, 95) * 1000, 1),
+        "latency_p99_ms": round(percentile(latencies, 99) * 1000, 1),
+        "latency_mean_ms": round(statistics.mean(latencies) * 1000, 1),
+        **outcomes,
+        "router": evaluator.router.get_stats()
+    }
+
+
+def main():
+    parser = mock_openrouter.build_arg_parser()
+    parser.description = "Evaluator load test against a local OpenRouter mock"
+    parser.add_argument("--url", help="use an already running mock instead of starting one")
+    parser.add_argument("--concurrency", default="1,4,16,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--no-hedge", action="store_true", help="route to the primary model only")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    if args.url:
+        api_url = args.url
+    else:
+        mock_openrouter.configure(args)
+        start_mock(args.port)
+        api_url = f"http://127.0.0.1:{args.port}/api/v1/chat/completions"
+
+    results = []
+    for level in [int(c) for c in args.concurrency.split(',')]:
+        result = run_level(api_url, level, args.requests, not args.no_hedge)
+        results.append(result)
+        if not args.json:
+            print(f"concurrency={level:<4} rps={result['throughput_rps']:<8} "
+                  f"p50={result['latency_p50_ms']}ms p95={result['latency_p95_ms']}ms p99={result['latency_p99_ms']}ms "
+                  f"ok={result['success']} err={result['error']} "
+                  f"grade_parsed={result['grade_extracted']} grade_heuristic={result['grade_heuristic']}", flush=True)
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
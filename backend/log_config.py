@@ -0,0 +1,226 @@
+import atexit
+import contextvars
+import hmac
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, Optional
+
+TRACE_HEADER = "X-Trace-Id"
+SAMPLED_HEADER = "X-Trace-Sampled"
+INTERNAL_TOKEN_HEADER = "X-Internal-Token"
+# Shared secret between the backend services; X-Trace-Sampled is only honoured alongside it
+INTERNAL_SERVICE_TOKEN = os.environ.get("INTERNAL_SERVICE_TOKEN") or os.environ.get("PROFILE_ADMIN_TOKEN", "")
+
+# Keys whose values are never written to logs
+REDACTED_KEYS = {"authorization", "api_key", "apikey", "password", "token", "secret", "cookie"}
+MAX_STRING_CHARS = 200
+MAX_LIST_ITEMS = 10
+
+_trace_id = contextvars.ContextVar("trace_id", default=None)
+_sampled = contextvars.ContextVar("sampled", default=False)
+
+
+def current_trace_id() -> Optional[str]:
+    return _trace_id.get()
+
+
+def is_sampled() -> bool:
+    """True when full-detail debug logging is enabled for the current request."""
+    return _sampled.get()
+
+
+def trace_headers() -> Dict[str, str]:
+    """Headers that carry the current trace into calls to the other backend service."""
+    trace_id = _trace_id.get()
+    if not trace_id:
+        return {}
+    headers = {TRACE_HEADER: trace_id}
+    if INTERNAL_SERVICE_TOKEN:
+        headers[SAMPLED_HEADER] = "1" if _sampled.get() else "0"
+        headers[INTERNAL_TOKEN_HEADER] = INTERNAL_SERVICE_TOKEN
+    return headers
+
+
+def _is_internal(request) -> bool:
+    token = request.headers.get(INTERNAL_TOKEN_HEADER, "")
+    # Compared as bytes: compare_digest raises on non-ASCII str
+    return bool(INTERNAL_SERVICE_TOKEN) and hmac.compare_digest(token.encode(), INTERNAL_SERVICE_TOKEN.encode())
+
+
+@contextmanager
+def trace_context(trace_id: Optional[str] = None, sampled: bool = False):
+    """Run a block (e.g. a background job) under the given trace id."""
+    trace_token = _trace_id.set(trace_id or uuid.uuid4().hex)
+    sampled_token = _sampled.set(sampled)
+    try:
+        yield
+    finally:
+        _trace_id.reset(trace_token)
+        _sampled.reset(sampled_token)
+
+
+def redact(value, max_chars: int = MAX_STRING_CHARS):
+    """Copy of a JSON-like value with secrets masked and long strings/lists truncated."""
+    if isinstance(value, dict):
+        return {
+            k: "[REDACTED]" if str(k).lower() in REDACTED_KEYS else redact(v, max_chars)
+            for k, v in value.items()
+        }
+    if isinstance(value, (list, tuple)):
+        items = [redact(v, max_chars) for v in value[:MAX_LIST_ITEMS]]
+        if len(value) > MAX_LIST_ITEMS:
+            items.append(f"... (+{len(value) - MAX_LIST_ITEMS} items)")
+        return items
+    if isinstance(value, str) and len(value) > max_chars:
+        return value[:max_chars] + f"... (+{len(value) - max_chars} chars)"
+    return value
+
+
+class Redacted:
+    """Lazy log argument: redaction and serialization only happen if the record is emitted."""
+
+    def __init__(self, value, max_chars: int = MAX_STRING_CHARS):
+        self.value = value
+        self.max_chars = max_chars
+
+    def __str__(self):
+        return json.dumps(redact(self.value, self.max_chars), default=str)
+
+
+class JsonFormatter(logging.Formatter):
+    def __init__(self, service: str):
+        super().__init__()
+        self.service = service
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "service": self.service,
+            "logger": record.name,
+            "trace_id": getattr(record, "trace_id", None),
+            "msg": record.getMessage()
+        }
+        fields = getattr(record, "fields", None)
+        if fields:
+            entry.update(fields)
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _TraceFilter(logging.Filter):
+    """Stamp records with the trace id and drop DEBUG records for unsampled requests."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno < logging.INFO and not _sampled.get():
+            return False
+        record.trace_id = _trace_id.get()
+        return True
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that leaves JSON encoding and I/O to the background listener thread.
+
+    The message itself is rendered here, on the logging thread: its arguments
+    (e.g. a Redacted result dict) may be mutated by the caller once the log call
+    returns. Filtered-out records never reach prepare(), so they cost nothing.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record.msg = record.getMessage()
+        record.args = None
+        fields = getattr(record, "fields", None)
+        if fields:
+            record.fields = dict(fields)
+        if record.exc_info:
+            # Traceback objects cannot outlive the frame safely; render them now
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+def setup_logging(service: str, level: Optional[str] = None) -> logging.handlers.QueueListener:
+    """Route all logging through a queue drained by a background writer thread.
+
+    Records are written as one JSON object per line to stderr (and LOG_FILE if
+    set). DEBUG records are only kept for sampled requests.
+    """
+    log_queue = queue.SimpleQueue()
+    formatter = JsonFormatter(service)
+    handlers = [logging.StreamHandler()]
+    log_file = os.environ.get("LOG_FILE")
+    if log_file:
+        handlers.append(logging.handlers.RotatingFileHandler(log_file, maxBytes=50 * 1024 * 1024, backupCount=5))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    queue_handler = _DeferredQueueHandler(log_queue)
+    queue_handler.addFilter(_TraceFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level or os.environ.get("LOG_LEVEL", "DEBUG"))
+    # Third-party request logs are noise at DEBUG
+    logging.getLogger("urllib3").setLevel(logging.INFO)
+
+    listener = logging.handlers.QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+    return listener
+
+
+def init_app(app, sample_rates: Optional[Dict[str, float]] = None, default_rate: float = 0.01):
+    """Attach per-request trace ids, debug sampling and access logs to a Flask app.
+
+    ``sample_rates`` maps a path to the fraction of its requests that get
+    full-detail debug logging. Another backend service can force the decision
+    with X-Trace-Sampled, which is how a sampled evaluate request carries
+    through to compile; the header is ignored unless the request also carries
+    X-Internal-Token matching INTERNAL_SERVICE_TOKEN, so external clients
+    cannot switch on debug logging.
+    """
+    from flask import request, g
+
+    sample_rates = sample_rates or {}
+    access_logger = logging.getLogger("access")
+
+    @app.before_request
+    def _start_trace():
+        trace_id = request.headers.get(TRACE_HEADER) or uuid.uuid4().hex
+        forced = request.headers.get(SAMPLED_HEADER)
+        if forced is not None and _is_internal(request):
+            sampled = forced == "1"
+        else:
+            sampled = random.random() < sample_rates.get(request.path, default_rate)
+        g.trace_tokens = (_trace_id.set(trace_id), _sampled.set(sampled))
+        g.trace_start = time.monotonic()
+
+    @app.after_request
+    def _end_trace(response):
+        response.headers[TRACE_HEADER] = _trace_id.get() or ""
+        access_logger.info("%s %s %s", request.method, request.path, response.status_code, extra={"fields": {
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.monotonic() - g.get("trace_start", time.monotonic())) * 1000, 1)
+        }})
+        return response
+
+    @app.teardown_request
+    def _reset_trace(exc=None):
+        tokens = g.pop("trace_tokens", None)
+        if tokens:
+            try:
+                _trace_id.reset(tokens[0])
+                _sampled.reset(tokens[1])
+            except ValueError:
+                # Streaming responses finish in a different context; nothing to restore
+                pass
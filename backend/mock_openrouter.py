@@ -0,0 +1,168 @@
+"""Local stand-in for the OpenRouter chat-completions API.
+
+Run it and point the evaluator at it to measure throughput, timeouts and
+response parsing without spending API quota:
+
+    python mock_openrouter.py --latency lognormal:800:0.5 --error-rate 0.02 --rate-limit-rate 0.05
+    OPENROUTER_API_URL=http://localhost:5050/api/v1/chat/completions python test_cors.py
+
+Latency distributions (milliseconds): fixed:MS, uniform:LO:HI,
+lognormal:MEDIAN:SIGMA. The response mix is a comma-separated list of
+kind=weight pairs over: markdown, html, no_grade, malformed, empty.
+"""
+import argparse
+import json
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+
+from flask import Flask, request, jsonify
+
+logger = logging.getLogger(__name__)
+
+app = Flask(__name__)
+
+REVIEW_TEMPLATES = {
+    "markdown": (
+        "## Correctness\n* The {language} code handles the main cases.\n"
+        "## Efficiency\n* Runs in linear time.\n"
+        "## Suggestions\n* Add input validation.\n\nFinal Grade: {grade}/10"
+    ),
+    "html": (
+        "<h2>Correctness</h2><p>The {language} code is mostly correct &amp; readable.</p>"
+        "<ul><li>Good naming</li><li>Missing edge cases</li></ul>"
+        "<pre><code>if x &lt; 0: return</code></pre><p>Overall Grade: {grade}/10</p>"
+    ),
+    "no_grade": (
+        "The code is clean and efficient, with good practice around naming, "
+        "but there is an issue with error handling and one redundant loop."
+    )
+}
+
+config = {
+    "latency": "lognormal:600:0.6",
+    "error_rate": 0.0,
+    "rate_limit_rate": 0.0,
+    "mix": {"markdown": 0.7, "html": 0.15, "no_grade": 0.1, "malformed": 0.03, "empty": 0.02}
+}
+stats = {"requests": 0, "errors": 0, "rate_limited": 0}
+stats_lock = threading.Lock()
+
+
+def parse_mix(text: str) -> dict:
+    mix = {}
+    for part in text.split(','):
+        kind, weight = part.split('=')
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+def sample_latency(spec: str) -> float:
+    """Return a latency in seconds drawn from a distribution spec."""
+    kind, *params = spec.split(':')
+    params = [float(p) for p in params]
+    if kind == "fixed":
+        ms = params[0]
+    elif kind == "uniform":
+        ms = random.uniform(params[0], params[1])
+    elif kind == "lognormal":
+        ms = random.lognormvariate(math.log(params[0]), params[1])
+    else:
+        raise ValueError(f"Unknown latency distribution: {spec}")
+    return ms / 1000.0
+
+
+def _count(key: str):
+    with stats_lock:
+        stats[key] += 1
+
+
+def _completion_content(payload: dict, kind: str) -> str:
+    system = payload.get("messages", [{}])[0].get("content", "")
+    if "question generator" in system:
+        return json.dumps([f"Write a function for mock question {uuid.uuid4().hex[:8]}." for _ in range(5)])
+    user = payload.get("messages", [{}, {}])[-1].get("content", "")
+    language = user.split("Review this ", 1)[-1].split(" ", 1)[0] if "Review this " in user else "code"
+    return REVIEW_TEMPLATES[kind].format(language=language, grade=random.randint(4, 10))
+
+
+@app.route('/api/v1/chat/completions', methods=['POST'])
+def chat_completions():
+    payload = request.get_json(force=True, silent=True) or {}
+    _count("requests")
+    time.sleep(sample_latency(config["latency"]))
+
+    roll = random.random()
+    if roll < config["rate_limit_rate"]:
+        _count("rate_limited")
+        return jsonify({"error": {"message": "Rate limit exceeded", "code": 429}}), 429
+    if roll < config["rate_limit_rate"] + config["error_rate"]:
+        _count("errors")
+        return jsonify({"error": {"message": "Upstream provider error", "code": 502}}), 502
+
+    kinds = list(config["mix"])
+    kind = random.choices(kinds, weights=[config["mix"][k] for k in kinds])[0]
+    if kind == "malformed":
+        return "<html><body>502 Bad Gateway</body></html>", 200, {"Content-Type": "text/html"}
+    completion_id = f"gen-mock-{uuid.uuid4().hex[:12]}"
+    if kind == "empty":
+        return jsonify({"id": completion_id, "model": payload.get("model"), "choices": []})
+
+    content = _completion_content(payload, kind)
+    prompt_chars = sum(len(m.get("content", "")) for m in payload.get("messages", []))
+    return jsonify({
+        "id": completion_id,
+        "object": "chat.completion",
+        "model": payload.get("model"),
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+        "usage": {
+            "prompt_tokens": prompt_chars // 4,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": (prompt_chars + len(content)) // 4
+        }
+    })
+
+
+@app.route('/_config', methods=['GET', 'POST'])
+def mock_config():
+    """Inspect or change the mock's behaviour at runtime (e.g. between load-test phases)."""
+    if request.method == 'POST':
+        data = request.json or {}
+        for key in ("latency", "error_rate", "rate_limit_rate"):
+            if key in data:
+                config[key] = data[key]
+        if "mix" in data:
+            config["mix"] = parse_mix(data["mix"]) if isinstance(data["mix"], str) else data["mix"]
+        sample_latency(config["latency"])
+    with stats_lock:
+        return jsonify({"config": config, "stats": dict(stats)})
+
+
+def configure(args):
+    config["latency"] = args.latency
+    config["error_rate"] = args.error_rate
+    config["rate_limit_rate"] = args.rate_limit_rate
+    if args.mix:
+        config["mix"] = parse_mix(args.mix)
+    sample_latency(config["latency"])
+
+
+def build_arg_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Mock OpenRouter chat-completions server")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--latency", default=config["latency"], help="fixed:MS | uniform:LO:HI | lognormal:MEDIAN:SIGMA")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fraction of 502 responses")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="fraction of 429 responses")
+    parser.add_argument("--mix", default="", help="response kinds, e.g. markdown=0.8,html=0.1,malformed=0.1")
+    return parser
+
+
+if __name__ == '__main__':
+    args = build_arg_parser().parse_args()
+    configure(args)
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Mock OpenRouter listening on port {args.port} with config {config}")
+    app.run(port=args.port, threaded=True)
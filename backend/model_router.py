@@ -0,0 +1,270 @@
+import threading
+import time
+import logging
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Optional
+
+import requests
+
+logger = logging.getLogger(__name__)
+
+
+class RouterError(requests.exceptions.RequestException):
+    """Raised when no upstream model produced a valid answer."""
+
+
+# Share of the latency budget to wait before hedging while a model has no latency history yet
+COLD_HEDGE_FRACTION = 0.25
+# How often a caller re-checks whether its queued attempt has started
+START_POLL_INTERVAL = 0.05
+
+
+class ModelStats:
+    """Rolling latency/error statistics and circuit breaker state for one model."""
+
+    def __init__(self, window: int = 100, failure_threshold: int = 3, cooldown: float = 60.0):
+        self.latencies = deque(maxlen=window)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.requests = 0
+        self.successes = 0
+        self.errors = 0
+        self.hedges = 0
+        self.consecutive_failures = 0
+        self.opened_at = None
+        # A half-open breaker lets one request through at a time
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def record_success(self, latency: float):
+        with self.lock:
+            self.requests += 1
+            self.successes += 1
+            self.latencies.append(latency)
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self, latency: float):
+        with self.lock:
+            self.requests += 1
+            self.errors += 1
+            self.latencies.append(latency)
+            self.consecutive_failures += 1
+            if self.consecutive_failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+    def _half_open(self) -> bool:
+        return self.opened_at is not None and time.monotonic() - self.opened_at >= self.cooldown
+
+    def is_available(self) -> bool:
+        """Closed breakers are available; open ones become half-open after the cooldown
+        and are available while no probe is in flight."""
+        with self.lock:
+            return self.opened_at is None or (self._half_open() and not self.probing)
+
+    def acquire(self, force: bool = False) -> Optional[str]:
+        """Admit one attempt: "closed", "probe" (the single half-open probe) or None when not admitted.
+
+        force probes an open breaker before its cooldown, still one caller at a time.
+        """
+        with self.lock:
+            if self.opened_at is None:
+                return "closed"
+            if (force or self._half_open()) and not self.probing:
+                self.probing = True
+                return "probe"
+            return None
+
+    def release_probe(self):
+        """Give up a probe that never sent its request."""
+        with self.lock:
+            self.probing = False
+
+    def percentile(self, pct: float) -> Optional[float]:
+        with self.lock:
+            if not self.latencies:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(round(pct / 100.0 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def snapshot(self) -> Dict[str, Any]:
+        p50, p95, p99 = self.percentile(50), self.percentile(95), self.percentile(99)
+        with self.lock:
+            if self.opened_at is None:
+                state = "closed"
+            elif self._half_open():
+                state = "half-open"
+            else:
+                state = "open"
+            return {
+                "requests": self.requests,
+                "successes": self.successes,
+                "errors": self.errors,
+                "hedges": self.hedges,
+                "error_rate": round(self.errors / self.requests, 3) if self.requests else 0.0,
+                "latency_p50": round(p50, 3) if p50 is not None else None,
+                "latency_p95": round(p95, 3) if p95 is not None else None,
+                "latency_p99": round(p99, 3) if p99 is not None else None,
+                "circuit": state
+            }
+
+
+class ModelRouter:
+    """Route chat-completion calls over an ordered list of models.
+
+    Each route is a dict with ``model``, ``latency_budget`` (seconds) and an
+    optional ``api_url``. The first available model is tried first; if it has
+    not answered by its observed p95 (capped by its budget) a hedged request is
+    sent to the next model and whichever valid answer arrives first wins.
+    Hedge delays and per-attempt timeouts count from when an attempt actually
+    starts on a pool thread, so queueing under load does not trigger hedges;
+    size max_workers to the number of concurrent callers times the routes.
+    Every attempt that sends a request counts towards its model's statistics,
+    including one that loses to a hedge.
+    """
+
+    def __init__(self, routes: List[Dict[str, Any]], api_url: str, headers: Dict[str, str],
+                 total_timeout: float = 45.0, failure_threshold: int = 3, cooldown: float = 60.0,
+                 max_workers: int = 16):
+        if not routes:
+            raise ValueError("ModelRouter requires at least one route")
+        self.routes = routes
+        self.api_url = api_url
+        self.headers = headers
+        self.total_timeout = total_timeout
+        self.stats = {
+            route["model"]: ModelStats(failure_threshold=failure_threshold, cooldown=cooldown)
+            for route in routes
+        }
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model-router")
+
+    def _hedge_delay(self, route: Dict[str, Any]) -> float:
+        budget = route.get("latency_budget", 30)
+        p95 = self.stats[route["model"]].percentile(95)
+        if p95 is None:
+            # No history yet (e.g. after a restart); waiting the whole budget would never hedge
+            return budget * COLD_HEDGE_FRACTION
+        return min(budget, p95)
+
+    def _call(self, route: Dict[str, Any], payload: Dict[str, Any], deadline: float,
+              attempt: Dict[str, Any], cancelled: threading.Event) -> Dict[str, Any]:
+        model = route["model"]
+        stats = self.stats[model]
+        body = dict(payload, model=model)
+        start = time.monotonic()
+        attempt["started"] = start
+        if cancelled.is_set():
+            # Another attempt already answered; nothing was sent, so nothing to record
+            if attempt["admission"] == "probe":
+                stats.release_probe()
+            raise RouterError(f"Request to {model} cancelled")
+        timeout = min(route.get("latency_budget", 30), max(1.0, deadline - start))
+        try:
+            with requests.Session() as session:
+                response = session.post(
+                    route.get("api_url", self.api_url),
+                    headers=self.headers,
+                    json=body,
+                    timeout=timeout
+                )
+                response.raise_for_status()
+                response_json = response.json()
+            if not response_json or not response_json.get("choices"):
+                raise RouterError(f"No choices returned from {model}")
+        except Exception:
+            # Recorded even when a hedge already won, so a model that keeps losing opens its breaker
+            stats.record_failure(time.monotonic() - start)
+            raise
+        stats.record_success(time.monotonic() - start)
+        response_json["routed_model"] = model
+        return response_json
+
+    def chat_completion(self, payload: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the first valid chat-completion response, hedging and falling back as needed."""
+        candidates = [r for r in self.routes if self.stats[r["model"]].is_available()]
+        forced = not candidates
+        if forced:
+            # Every breaker is open: probe the preferred model rather than failing outright.
+            candidates = self.routes[:1]
+
+        deadline = time.monotonic() + self.total_timeout
+        cancelled = threading.Event()
+        pending = {}
+        errors = []
+        next_index = 0
+
+        def launch():
+            """Start the next admitted candidate; None when no remaining one is admitted."""
+            nonlocal next_index
+            while next_index < len(candidates):
+                route = candidates[next_index]
+                next_index += 1
+                admission = self.stats[route["model"]].acquire(force=forced)
+                if admission is None:
+                    # Half-open and another caller is already probing it
+                    continue
+                attempt = {"route": route, "started": None, "admission": admission}
+                future = self.executor.submit(self._call, route, payload, deadline, attempt, cancelled)
+                pending[future] = attempt
+                return attempt
+            return None
+
+        current = launch()
+        if current is None:
+            raise RouterError("All models failed: every available model is already being probed")
+        try:
+            while pending:
+                now = time.monotonic()
+                remaining = deadline - now
+                if remaining <= 0:
+                    break
+                wait_for = remaining
+                hedge_due = False
+                if next_index < len(candidates):
+                    if current["started"] is None:
+                        # Still queued for a pool thread; the hedge timer has not started
+                        wait_for = min(remaining, START_POLL_INTERVAL)
+                    else:
+                        hedge_at = current["started"] + self._hedge_delay(current["route"])
+                        wait_for = min(remaining, max(0.0, hedge_at - now))
+                        hedge_due = True
+                done, _ = wait(list(pending), timeout=wait_for, return_when=FIRST_COMPLETED)
+
+                if not done:
+                    # The in-flight request is slower than its p95: hedge with the next model.
+                    if hedge_due and time.monotonic() - current["started"] >= self._hedge_delay(current["route"]):
+                        model = current["route"]["model"]
+                        hedge = launch()
+                        if hedge is not None:
+                            with self.stats[model].lock:
+                                self.stats[model].hedges += 1
+                            logger.info("Hedging %s with %s", model, hedge["route"]["model"])
+                            current = hedge
+                    continue
+
+                for future in done:
+                    route = pending.pop(future)["route"]
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        logger.warning("Model %s failed: %s", route["model"], e)
+                        errors.append(f"{route['model']}: {e}")
+
+                if not pending and next_index < len(candidates):
+                    current = launch() or current
+        finally:
+            cancelled.set()
+            for future, attempt in pending.items():
+                if future.cancel() and attempt["admission"] == "probe":
+                    self.stats[attempt["route"]["model"]].release_probe()
+
+        if not errors:
+            errors.append(f"no answer within {self.total_timeout}s")
+        raise RouterError("All models failed: " + "; ".join(errors))
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {route["model"]: self.stats[route["model"]].snapshot() for route in self.routes}
@@ -0,0 +1,329 @@
+import contextvars
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import random
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from io import StringIO
+from typing import Dict, Any, Optional
+
+from log_config import current_trace_id
+
+logger = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Profile"
+ADMIN_TOKEN_HEADER = "X-Admin-Token"
+# On-demand profiling is disabled unless an admin token is configured
+PROFILE_ADMIN_TOKEN = os.environ.get("PROFILE_ADMIN_TOKEN", "")
+# Fraction of requests profiled automatically with the sampling profiler
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+MAX_STORED_PROFILES = 200
+SAMPLE_INTERVAL = 0.005
+
+_waits = contextvars.ContextVar("profile_waits", default=None)
+# {"id", "mode", "service"} of the profile being captured for the current request
+_active_profile = contextvars.ContextVar("active_profile", default=None)
+_stores = {}
+
+
+def record_wait(kind: str, seconds: float):
+    """Attribute blocking time (e.g. subprocess or upstream HTTP) to the profiled request, if any."""
+    waits = _waits.get()
+    if waits is not None:
+        entry = waits.setdefault(kind, {"count": 0, "seconds": 0.0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+
+
+@contextmanager
+def timed_wait(kind: str):
+    start = time.monotonic()
+    try:
+        yield
+    finally:
+        record_wait(kind, time.monotonic() - start)
+
+
+class StackSampler:
+    """Sampling profiler for one thread that produces folded stacks for flamegraph tools."""
+
+    def __init__(self, thread_id: int, interval: float = SAMPLE_INTERVAL):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = Counter()
+        self.stop_event = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True, name="stack-sampler")
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.stop_event.set()
+        self.thread.join()
+
+    def _run(self):
+        while not self.stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            names = []
+            while frame is not None:
+                code = frame.f_code
+                names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+                frame = frame.f_back
+            if names:
+                self.stacks[';'.join(reversed(names))] += 1
+
+    def folded(self) -> str:
+        return '\n'.join(f"{stack} {count}" for stack, count in self.stacks.most_common())
+
+
+class ProfileStore:
+    """Directory of captured profiles plus a JSON metadata file per profile.
+
+    Work a request hands to other threads (queued jobs, pipeline stages) is
+    stored as numbered parts of the request's profile: ``<id>.<n>.<ext>``
+    files listed in ``<id>.parts.jsonl``.
+    """
+
+    def __init__(self, directory: str, max_profiles: int = MAX_STORED_PROFILES):
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def save(self, profile_id: str, extension: str, write, metadata: Dict[str, Any]):
+        path = os.path.join(self.directory, f"{profile_id}.{extension}")
+        write(path)
+        metadata = dict(metadata, id=profile_id, file=os.path.basename(path))
+        with open(os.path.join(self.directory, f"{profile_id}.json"), 'w') as f:
+            json.dump(metadata, f)
+        self._prune()
+
+    def add_part(self, profile_id: str, extension: str, write, metadata: Dict[str, Any]):
+        """Store a capture taken on another thread as the next part of profile_id."""
+        with self.lock:
+            number = len(self.parts(profile_id))
+            name = f"{profile_id}.{number}.{extension}"
+            write(os.path.join(self.directory, name))
+            with open(os.path.join(self.directory, f"{profile_id}.parts.jsonl"), 'a') as f:
+                f.write(json.dumps(dict(metadata, part=number, file=name)) + "\n")
+
+    def parts(self, profile_id: str):
+        path = os.path.join(self.directory, f"{os.path.basename(profile_id)}.parts.jsonl")
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return [json.loads(line) for line in f if line.strip()]
+
+    def list(self):
+        profiles = []
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                with open(os.path.join(self.directory, name)) as f:
+                    profiles.append(json.load(f))
+        return sorted(profiles, key=lambda p: p["created"], reverse=True)
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        path = os.path.join(self.directory, f"{os.path.basename(profile_id)}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path) as f:
+            metadata = json.load(f)
+        metadata["path"] = os.path.join(self.directory, metadata["file"])
+        metadata["parts"] = self.parts(profile_id)
+        # Waits recorded on worker threads count towards the request as well
+        waits = {kind: dict(w) for kind, w in metadata.get("waits", {}).items()}
+        for part in metadata["parts"]:
+            for kind, w in part["waits"].items():
+                total = waits.setdefault(kind, {"count": 0, "ms": 0.0})
+                total["count"] += w["count"]
+                total["ms"] = round(total["ms"] + w["ms"], 1)
+        metadata["total_waits"] = waits
+        return metadata
+
+    def _prune(self):
+        profiles = self.list()
+        for metadata in profiles[self.max_profiles:]:
+            names = [metadata["file"], f"{metadata['id']}.json", f"{metadata['id']}.parts.jsonl"]
+            names += [part["file"] for part in self.parts(metadata["id"])]
+            for name in names:
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
+
+
+def _start_profiler(mode: str):
+    """Start profiling the calling thread; returns the (mode, profiler) actually used."""
+    if mode == "cprofile":
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+            return mode, profiler
+        except ValueError:
+            # Python 3.12+ allows only one active cProfile per process
+            pass
+    profiler = StackSampler(threading.get_ident())
+    profiler.start()
+    return "sample", profiler
+
+
+def _stop_profiler(mode: str, profiler):
+    """Stop a profiler; returns the file extension and a function writing the capture to a path."""
+    if mode == "sample":
+        profiler.stop()
+
+        def write(path):
+            with open(path, 'w') as f:
+                f.write(profiler.folded())
+        return "folded", write
+    profiler.disable()
+    return "pstats", profiler.dump_stats
+
+
+def _summarize_waits(waits) -> Dict[str, Any]:
+    return {kind: {"count": w["count"], "ms": round(w["seconds"] * 1000, 1)} for kind, w in waits.items()}
+
+
+def profile_job_context() -> Optional[Dict[str, Any]]:
+    """The current request's profile, for a job payload; None when the request is not profiled."""
+    profile = _active_profile.get()
+    return dict(profile) if profile else None
+
+
+@contextmanager
+def profile_thread(profile: Optional[Dict[str, Any]], label: str):
+    """Profile work done on this thread on behalf of a profiled request.
+
+    ``profile`` is what profile_job_context() returned in the request; the
+    capture and the waits recorded meanwhile are stored as a part of that
+    request's profile. Does nothing when profile is None.
+    """
+    store = _stores.get(profile["service"]) if profile else None
+    if store is None:
+        yield
+        return
+    waits_token = _waits.set({})
+    profile_token = _active_profile.set(profile)
+    start = time.monotonic()
+    mode, profiler = _start_profiler(profile["mode"])
+    try:
+        yield
+    finally:
+        extension, write = _stop_profiler(mode, profiler)
+        waits = _waits.get()
+        _waits.reset(waits_token)
+        _active_profile.reset(profile_token)
+        store.add_part(profile["id"], extension, write, {
+            "label": label,
+            "mode": mode,
+            "thread": threading.current_thread().name,
+            "created": time.time(),
+            "duration_ms": round((time.monotonic() - start) * 1000, 1),
+            "waits": _summarize_waits(waits)
+        })
+
+
+def _is_admin(request) -> bool:
+    token = request.headers.get(ADMIN_TOKEN_HEADER, "")
+    # Constant-time, on bytes so a non-ASCII header cannot raise
+    return bool(PROFILE_ADMIN_TOKEN) and hmac.compare_digest(token.encode(), PROFILE_ADMIN_TOKEN.encode())
+
+
+def init_profiling(app, service: str, directory: Optional[str] = None):
+    """Enable per-request profiling on a Flask app.
+
+    An admin (X-Admin-Token matching PROFILE_ADMIN_TOKEN) can profile a request
+    with ``X-Profile: cprofile|sample`` or ``?profile=cprofile|sample``;
+    PROFILE_SAMPLE_RATE profiles a random share of requests with the sampling
+    profiler. cProfile captures are stored as .pstats, sampled ones as folded
+    stacks, and can be downloaded from /profiles/<id>. Work the request hands
+    to other threads is attached through profile_job_context()/profile_thread().
+    """
+    from flask import request, g, jsonify, send_file
+
+    store = ProfileStore(directory or os.path.join(tempfile.gettempdir(), "codearena-profiles", service))
+    _stores[service] = store
+
+    @app.before_request
+    def _start_profile():
+        if request.path.startswith("/profiles"):
+            return
+        mode = request.headers.get(PROFILE_HEADER) or request.args.get("profile")
+        if mode and not _is_admin(request):
+            mode = None
+        if not mode and PROFILE_SAMPLE_RATE and random.random() < PROFILE_SAMPLE_RATE:
+            mode = "sample"
+        if not mode:
+            return
+        g.profile_id = uuid.uuid4().hex
+        g.profile_waits_token = _waits.set({})
+        g.profile_start = time.monotonic()
+        g.profile_mode, g.profiler = _start_profiler("sample" if mode == "sample" else "cprofile")
+        # Requested mode: worker threads retry cProfile even if this thread fell back
+        g.profile_token = _active_profile.set({"id": g.profile_id, "mode": mode if mode == "sample" else "cprofile",
+                                               "service": service})
+
+    @app.after_request
+    def _finish_profile(response):
+        profiler = g.pop("profiler", None)
+        if profiler is None:
+            return response
+        duration = time.monotonic() - g.profile_start
+        extension, write = _stop_profiler(g.profile_mode, profiler)
+        waits = _waits.get()
+        _waits.reset(g.pop("profile_waits_token"))
+        _active_profile.reset(g.pop("profile_token"))
+        profile_id = g.profile_id
+        store.save(profile_id, extension, write, {
+            "service": service,
+            "mode": g.profile_mode,
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "created": time.time(),
+            "duration_ms": round(duration * 1000, 1),
+            "waits": _summarize_waits(waits),
+            "trace_id": current_trace_id()
+        })
+        response.headers["X-Profile-Id"] = profile_id
+        logger.info("Captured %s profile %s for %s in %.1fms", g.profile_mode, profile_id, request.path, duration * 1000)
+        return response
+
+    @app.route('/profiles', methods=['GET'])
+    def list_profiles():
+        if not _is_admin(request):
+            return jsonify({"success": False, "error": "Admin token required"}), 403
+        return jsonify({"success": True, "profiles": store.list()})
+
+    @app.route('/profiles/<profile_id>', methods=['GET'])
+    def download_profile(profile_id):
+        """Download the raw .pstats/.folded file (?part=<n> for a worker-thread part),
+        or ?format=text for a top-functions summary of every cProfile capture combined."""
+        if not _is_admin(request):
+            return jsonify({"success": False, "error": "Admin token required"}), 403
+        metadata = store.get(profile_id)
+        if metadata is None:
+            return jsonify({"success": False, "error": f"Unknown profile: {profile_id}"}), 404
+        paths = [os.path.join(store.directory, c["file"]) for c in [metadata] + metadata["parts"]
+                 if c["mode"] == "cprofile"]
+        if request.args.get("format") == "text" and paths:
+            out = StringIO()
+            pstats.Stats(*paths, stream=out).sort_stats("cumulative").print_stats(40)
+            return out.getvalue(), 200, {"Content-Type": "text/plain"}
+        part = request.args.get("part")
+        if part is not None:
+            matches = [p for p in metadata["parts"] if str(p["part"]) == part]
+            if not matches:
+                return jsonify({"success": False, "error": f"Unknown part: {part}"}), 404
+            return send_file(os.path.join(store.directory, matches[0]["file"]),
+                             as_attachment=True, download_name=matches[0]["file"])
+        return send_file(metadata["path"], as_attachment=True, download_name=metadata["file"])
@@ -0,0 +1,401 @@
+import atexit
+import base64
+import binascii
+import hashlib
+import io
+import logging
+import os
+import posixpath
+import re
+import shutil
+import tempfile
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Callable
+
+logger = logging.getLogger(__name__)
+
+MAX_PROJECT_FILES = 200
+MAX_PROJECT_BYTES = 2 * 1024 * 1024
+DEFAULT_SESSION_TTL = 30 * 60
+COMPILE_TIMEOUT = 30
+MAX_PARALLEL_COMPILES = 4
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+SOURCE_EXTENSIONS = {
+    "c": (".c",),
+    "cpp": (".cpp", ".cc", ".cxx")
+}
+COMPILERS = {"c": "gcc", "cpp": "g++"}
+DEFAULT_ENTRIES = {
+    "python": ("main.py", "__main__.py", "app.py"),
+    "javascript": ("index.js", "main.js", "app.js")
+}
+JAVA_TYPE_PATTERN = re.compile(r'\b(?:class|interface|enum|record)\s+([A-Za-z_]\w*)')
+JAVA_PACKAGE_PATTERN = re.compile(r'^\s*package\s+([\w.]+)\s*;', re.MULTILINE)
+JAVA_MAIN_PATTERN = re.compile(r'public\s+static\s+void\s+main\s*\(')
+IDENTIFIER_PATTERN = re.compile(r'\b[A-Za-z_]\w*\b')
+
+
+class ProjectError(ValueError):
+    """Invalid project submission (bad paths, too large, no entry point...)."""
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+def _clean_path(path: str) -> str:
+    normalized = posixpath.normpath(path.replace('\\', '/'))
+    if normalized.startswith('/') or normalized == '.' or normalized.split('/')[0] == '..':
+        raise ProjectError(f"Invalid file path: {path}")
+    return normalized
+
+
+def read_project_files(files: Optional[Dict[str, str]] = None, archive: Optional[str] = None) -> Dict[str, str]:
+    """Return {relative path: source} from a file map or a base64-encoded zip archive."""
+    if archive:
+        try:
+            data = base64.b64decode(archive, validate=True)
+            with zipfile.ZipFile(io.BytesIO(data)) as zf:
+                entries = [info for info in zf.infolist() if not info.is_dir()]
+                if len(entries) > MAX_PROJECT_FILES:
+                    raise ProjectError(f"Project has more than {MAX_PROJECT_FILES} files")
+                if sum(info.file_size for info in entries) > MAX_PROJECT_BYTES:
+                    raise ProjectError(f"Project is larger than {MAX_PROJECT_BYTES} bytes")
+                files = {info.filename: zf.read(info).decode('utf-8', errors='replace') for info in entries}
+        except (binascii.Error, zipfile.BadZipFile) as e:
+            raise ProjectError(f"Invalid archive: {str(e)}")
+        # Archives usually wrap everything in one top-level folder; drop it
+        tops = {name.split('/', 1)[0] for name in files}
+        if len(tops) == 1 and all('/' in name for name in files):
+            files = {name.split('/', 1)[1]: text for name, text in files.items()}
+
+    if not files:
+        raise ProjectError("A project needs a non-empty 'files' map or 'archive'")
+    if len(files) > MAX_PROJECT_FILES:
+        raise ProjectError(f"Project has more than {MAX_PROJECT_FILES} files")
+    if sum(len(text) for text in files.values()) > MAX_PROJECT_BYTES:
+        raise ProjectError(f"Project is larger than {MAX_PROJECT_BYTES} bytes")
+    return {_clean_path(path): text or '' for path, text in files.items()}
+
+
+class ProjectSession:
+    """A persistent source tree and build directory for one submitter's project."""
+
+    def __init__(self, session_id: str, directory: str):
+        self.session_id = session_id
+        self.directory = directory
+        self.src_dir = os.path.join(directory, "src")
+        self.build_dir = os.path.join(directory, "build")
+        self.lock = threading.Lock()
+        self.language = None
+        self.manifest = {}
+        # Per-language incremental state (object/dependency hashes, Java type maps)
+        self.state = {}
+        self.last_used = time.monotonic()
+
+    def reset(self, language: str):
+        for path in (self.src_dir, self.build_dir):
+            shutil.rmtree(path, ignore_errors=True)
+            os.makedirs(path)
+        self.language = language
+        self.manifest = {}
+        self.state = {}
+
+    def sync(self, files: Dict[str, str]):
+        """Write only new or changed files and delete removed ones; returns (changed, removed)."""
+        hashes = {path: content_hash(text) for path, text in files.items()}
+        changed = [path for path, digest in hashes.items() if self.manifest.get(path) != digest]
+        removed = [path for path in self.manifest if path not in hashes]
+        for path in changed:
+            full_path = os.path.join(self.src_dir, path)
+            os.makedirs(os.path.dirname(full_path), exist_ok=True)
+            with open(full_path, 'w') as f:
+                f.write(files[path])
+        for path in removed:
+            try:
+                os.remove(os.path.join(self.src_dir, path))
+            except OSError:
+                pass
+        self.manifest = hashes
+        return sorted(changed), sorted(removed)
+
+
+class ProjectSessionStore:
+    """Project sessions by id, each kept on disk until unused for ttl seconds.
+
+    Without a root, sessions live in a temporary directory removed at exit.
+    """
+
+    def __init__(self, root: Optional[str] = None, ttl: float = DEFAULT_SESSION_TTL):
+        self.root = root or tempfile.mkdtemp(prefix="compile_projects_")
+        self.ttl = ttl
+        self.sessions = {}
+        self.lock = threading.Lock()
+        if root is None:
+            atexit.register(self.close)
+
+    def close(self):
+        """Drop every session and remove the root directory."""
+        with self.lock:
+            self.sessions.clear()
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def get(self, session_id: str) -> ProjectSession:
+        if not SESSION_ID_PATTERN.match(session_id):
+            raise ProjectError("session_id must be 1-64 letters, digits, '-' or '_'")
+        self._prune()
+        with self.lock:
+            session = self.sessions.get(session_id)
+            if session is None:
+                session = self.sessions[session_id] = ProjectSession(session_id, os.path.join(self.root, session_id))
+            session.last_used = time.monotonic()
+            return session
+
+    def _prune(self):
+        cutoff = time.monotonic() - self.ttl
+        with self.lock:
+            expired = [s for s in self.sessions.values() if s.last_used < cutoff and not s.lock.locked()]
+            for session in expired:
+                del self.sessions[session.session_id]
+        for session in expired:
+            logger.debug("Expiring project session %s", session.session_id)
+            shutil.rmtree(session.directory, ignore_errors=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {"sessions": len(self.sessions), "ttl_seconds": self.ttl}
+
+
+def _combine(results: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge several compiler runs into one compilation result."""
+    return {
+        "stdout": ''.join(r["stdout"] for r in results),
+        "stderr": ''.join(r["stderr"] for r in results),
+        "returncode": next((r["returncode"] for r in results if r["returncode"] != 0), 0)
+    }
+
+
+class ProjectBuilder:
+    """Incremental per-language build plans for multi-file projects.
+
+    C/C++ compile each translation unit to an object file (tracking the headers
+    it includes via -MMD) and relink; Java recompiles changed files plus the
+    files that reference their types; Python and JavaScript only sync sources
+    and run an entry file. Only work invalidated by changed content is redone.
+    """
+
+    def __init__(self, run_command: Callable[..., Dict[str, Any]]):
+        self.run_command = run_command
+
+    def build(self, session: ProjectSession, language: str, changed: List[str], removed: List[str],
+              entry: Optional[str] = None) -> Dict[str, Any]:
+        """Bring the session's build up to date; returns a report with "run_command" set on success."""
+        start = time.monotonic()
+        if language in COMPILERS:
+            report = self._build_native(session, language)
+        elif language == "java":
+            report = self._build_java(session, changed, removed, entry)
+        else:
+            report = self._plan_script(session, language, entry)
+        report["changed"] = changed
+        report["removed"] = removed
+        report["build_ms"] = round((time.monotonic() - start) * 1000, 1)
+        return report
+
+    def _build_native(self, session: ProjectSession, language: str) -> Dict[str, Any]:
+        compiler = COMPILERS[language]
+        state = session.state.setdefault("units", {})
+        units = sorted(p for p in session.manifest if p.endswith(SOURCE_EXTENSIONS[language]))
+        if not units:
+            raise ProjectError(f"No {language} source files ({', '.join(SOURCE_EXTENSIONS[language])}) in project")
+
+        def stale(unit):
+            entry = state.get(unit)
+            if entry is None or entry["hash"] != session.manifest[unit]:
+                return True
+            if not os.path.exists(self._object_path(session, unit)):
+                return True
+            return any(session.manifest.get(dep) != digest for dep, digest in entry["deps"].items())
+
+        to_compile = [unit for unit in units if stale(unit)]
+        for unit in set(state) - set(units):
+            state.pop(unit)
+            try:
+                os.remove(self._object_path(session, unit))
+            except OSError:
+                pass
+
+        results = {}
+        if to_compile:
+            with ThreadPoolExecutor(max_workers=min(MAX_PARALLEL_COMPILES, len(to_compile))) as pool:
+                for unit, result in zip(to_compile, pool.map(lambda u: self._compile_unit(session, compiler, u),
+                                                             to_compile)):
+                    results[unit] = result
+
+        failed = [unit for unit, result in results.items() if result["returncode"] != 0]
+        for unit, result in results.items():
+            if unit in failed:
+                state.pop(unit, None)
+            else:
+                state[unit] = {"hash": session.manifest[unit], "deps": self._read_deps(session, unit)}
+
+        report = {
+            "compiled": to_compile,
+            "reused": [unit for unit in units if unit not in results],
+            "linked": False
+        }
+        compile_results = [results[unit] for unit in to_compile]
+        if failed:
+            report["compilation"] = _combine(compile_results)
+            return report
+
+        executable = os.path.join(session.build_dir, "program")
+        objects = [self._object_path(session, unit) for unit in units]
+        if to_compile or session.state.get("linked_objects") != objects or not os.path.exists(executable):
+            link_result = self.run_command([compiler, "-o", executable] + objects, cwd=session.build_dir,
+                                           timeout=COMPILE_TIMEOUT)
+            compile_results.append(link_result)
+            report["linked"] = True
+            if link_result["returncode"] != 0:
+                session.state.pop("linked_objects", None)
+                report["compilation"] = _combine(compile_results)
+                return report
+            session.state["linked_objects"] = objects
+
+        report["compilation"] = _combine(compile_results)
+        report["run_command"] = [executable]
+        return report
+
+    @staticmethod
+    def _object_path(session: ProjectSession, unit: str) -> str:
+        return os.path.join(session.build_dir, unit + ".o")
+
+    def _compile_unit(self, session: ProjectSession, compiler: str, unit: str) -> Dict[str, Any]:
+        object_path = self._object_path(session, unit)
+        os.makedirs(os.path.dirname(object_path), exist_ok=True)
+        return self.run_command([compiler, "-c", os.path.join(session.src_dir, unit), "-o", object_path,
+                                 "-I", session.src_dir, "-MMD", "-MF", object_path[:-2] + ".d"],
+                                cwd=session.src_dir, timeout=COMPILE_TIMEOUT)
+
+    def _read_deps(self, session: ProjectSession, unit: str) -> Dict[str, str]:
+        """Project headers the unit included (from the -MMD file), with their hashes at compile time."""
+        try:
+            with open(self._object_path(session, unit)[:-2] + ".d") as f:
+                text = f.read().replace('\\\n', ' ')
+        except OSError:
+            return {}
+        deps = {}
+        for path in text.split(':', 1)[-1].split():
+            full_path = os.path.normpath(os.path.join(session.src_dir, path))
+            rel = os.path.relpath(full_path, session.src_dir).replace(os.sep, '/')
+            if rel != unit and rel in session.manifest:
+                deps[rel] = session.manifest[rel]
+        return deps
+
+    def _java_types(self, session: ProjectSession) -> Dict[str, Dict[str, Any]]:
+        """Declared types, package and referenced identifiers of every .java file (re-parsed only when changed)."""
+        previous = session.state.get("java_types", {})
+        types = {}
+        for path, digest in session.manifest.items():
+            if not path.endswith(".java"):
+                continue
+            if path in previous and previous[path]["hash"] == digest:
+                types[path] = previous[path]
+                continue
+            with open(os.path.join(session.src_dir, path)) as f:
+                source = f.read()
+            package = JAVA_PACKAGE_PATTERN.search(source)
+            types[path] = {
+                "hash": digest,
+                "package": package.group(1) if package else "",
+                "declares": set(JAVA_TYPE_PATTERN.findall(source)),
+                "references": set(IDENTIFIER_PATTERN.findall(source)),
+                "has_main": bool(JAVA_MAIN_PATTERN.search(source))
+            }
+        return types
+
+    def _build_java(self, session: ProjectSession, changed: List[str], removed: List[str],
+                    entry: Optional[str]) -> Dict[str, Any]:
+        types = self._java_types(session)
+        if not types:
+            raise ProjectError("No .java files in project")
+        previous = session.state.get("java_types", {})
+
+        # Class files of removed (or changed) sources may be stale; delete them and their dependents rebuild
+        dirty_types = set()
+        for path in set(removed) | set(changed):
+            info = previous.get(path)
+            if info is None:
+                continue
+            dirty_types |= info["declares"]
+            package_dir = os.path.join(session.build_dir, *info["package"].split('.')) if info["package"] else session.build_dir
+            for name in info["declares"]:
+                for class_file in self._class_files(package_dir, name):
+                    os.remove(class_file)
+        for path in changed:
+            dirty_types |= types.get(path, {}).get("declares", set())
+
+        if session.state.get("java_built"):
+            to_compile = {path for path in changed if path in types}
+            # Files referencing a type whose source changed must be recompiled too, transitively
+            frontier = set(dirty_types)
+            while frontier:
+                dependents = {path for path, info in types.items()
+                              if path not in to_compile and info["references"] & frontier}
+                to_compile |= dependents
+                frontier = set().union(*(types[p]["declares"] for p in dependents)) if dependents else set()
+        else:
+            to_compile = set(types)
+        to_compile = sorted(to_compile)
+
+        report = {"compiled": to_compile, "reused": sorted(set(types) - set(to_compile))}
+        compile_result = {"stdout": "", "stderr": "", "returncode": 0}
+        if to_compile:
+            compile_result = self.run_command(
+                ["javac", "-d", session.build_dir, "-cp", session.build_dir, "-sourcepath", session.src_dir]
+                + [os.path.join(session.src_dir, path) for path in to_compile],
+                cwd=session.src_dir, timeout=COMPILE_TIMEOUT)
+        report["compilation"] = compile_result
+        if compile_result["returncode"] != 0:
+            # Partial output of a failed javac run cannot be trusted; rebuild everything next time
+            session.state["java_built"] = False
+            return report
+
+        session.state["java_built"] = True
+        session.state["java_types"] = types
+        main_class = self._java_main_class(types, entry)
+        report["run_command"] = ["java", "-cp", session.build_dir, main_class]
+        return report
+
+    @staticmethod
+    def _class_files(package_dir: str, name: str) -> List[str]:
+        if not os.path.isdir(package_dir):
+            return []
+        return [os.path.join(package_dir, f) for f in os.listdir(package_dir)
+                if f == f"{name}.class" or f.startswith(f"{name}$")]
+
+    @staticmethod
+    def _java_main_class(types: Dict[str, Dict[str, Any]], entry: Optional[str]) -> str:
+        if entry and not entry.endswith(".java"):
+            return entry
+        candidates = [entry] if entry else sorted(p for p, info in types.items() if info["has_main"])
+        if not candidates or candidates[0] not in types:
+            raise ProjectError("No class with a main method found; pass 'entry'")
+        path = candidates[0]
+        name = os.path.splitext(os.path.basename(path))[0]
+        package = types[path]["package"]
+        return f"{package}.{name}" if package else name
+
+    def _plan_script(self, session: ProjectSession, language: str, entry: Optional[str]) -> Dict[str, Any]:
+        if entry is None:
+            entry = next((name for name in DEFAULT_ENTRIES[language] if name in session.manifest), None)
+        if entry is None and len(session.manifest) == 1:
+            entry = next(iter(session.manifest))
+        if entry is None or entry not in session.manifest:
+            raise ProjectError(f"Entry file not found; pass 'entry' (one of {', '.join(sorted(session.manifest))})")
+        command = "python" if language == "python" else "node"
+        return {"compiled": [], "reused": [], "run_command": [command, os.path.join(session.src_dir, entry)]}
@@ -0,0 +1,219 @@
+import math
+import re
+from typing import Dict, Any, List, Optional, Tuple
+
+# Conservative context window shared by the free models we route to
+CONTEXT_WINDOW_TOKENS = 16000
+MIN_OUTPUT_TOKENS = 500
+MAX_OUTPUT_TOKENS = 1500
+
+# Literal runs longer than this are collapsed to their first and last lines
+LITERAL_BLOCK_MIN_LINES = 6
+# Single lines longer than this (usually embedded data) are truncated
+MAX_LINE_CHARS = 240
+
+LINE_COMMENT_MARKERS = {
+    "python": "#",
+    "javascript": "//",
+    "java": "//",
+    "c": "//",
+    "cpp": "//",
+    "c++": "//",
+    "go": "//"
+}
+
+_LITERAL_TOKEN = (r'(?:0[xX][0-9a-fA-F]+|[-+]?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?[fFlLuU]?'
+                  r'|"(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\'|true|false|null|None|True|False)')
+_LITERAL_SEP_CHARS = r'[\s\[\]\{\}\(\),;:]'
+# Tokens must be separated by at least one separator character: with an optional
+# separator a digit run could be split into tokens in exponentially many ways
+_LITERAL_LINE = re.compile(rf'^{_LITERAL_SEP_CHARS}*{_LITERAL_TOKEN}(?:{_LITERAL_SEP_CHARS}+{_LITERAL_TOKEN})*'
+                           rf'{_LITERAL_SEP_CHARS}*$')
+_TOKEN_PATTERN = re.compile(r'\w+|[^\w\s]')
+
+
+class PromptTooLargeError(ValueError):
+    """Raised when a submission cannot fit the context window even after compaction."""
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough BPE token estimate: one token per punctuation mark, ~4 characters per word piece."""
+    tokens = 0
+    for match in _TOKEN_PATTERN.finditer(text):
+        piece = match.group(0)
+        tokens += math.ceil(len(piece) / 4) if piece[0].isalnum() or piece[0] == '_' else 1
+    return tokens + text.count('\n')
+
+
+def strip_comments(code: str, language: str) -> str:
+    """Remove comments while keeping string literals intact and the line count unchanged."""
+    marker = LINE_COMMENT_MARKERS.get(language)
+    if marker is None:
+        return code
+    block_comments = marker == "//"
+
+    out = []
+    i = 0
+    n = len(code)
+    quote = None
+    while i < n:
+        ch = code[i]
+        if quote:
+            out.append(ch)
+            if ch == '\\' and i + 1 < n:
+                out.append(code[i + 1])
+                i += 2
+                continue
+            if code.startswith(quote, i):
+                out.append(code[i + 1:i + len(quote)])
+                i += len(quote)
+                quote = None
+                continue
+            i += 1
+            continue
+
+        if language == "python" and code.startswith(('"""', "'''"), i):
+            quote = code[i:i + 3]
+            out.append(quote)
+            i += 3
+        elif ch in ('"', "'") or (ch == '`' and language == "javascript"):
+            quote = ch
+            out.append(ch)
+            i += 1
+        elif code.startswith(marker, i):
+            end = code.find('\n', i)
+            i = n if end == -1 else end
+        elif block_comments and code.startswith('/*', i):
+            end = code.find('*/', i + 2)
+            end = n if end == -1 else end + 2
+            # Keep the newlines so line numbers still line up with the original source
+            out.append('\n' * code.count('\n', i, end))
+            i = end
+        else:
+            out.append(ch)
+            i += 1
+    return ''.join(out)
+
+
+def _collapse_repeats(lines: List[Tuple[int, str]], max_block: int = 8) -> List[Tuple[int, str]]:
+    """Replace consecutive repetitions of the same block of lines with a one-line summary."""
+    result = []
+    i = 0
+    while i < len(lines):
+        collapsed = False
+        for size in range(1, max_block + 1):
+            block = [text for _, text in lines[i:i + size]]
+            if len(block) < size:
+                break
+            repeats = 1
+            while [text for _, text in lines[i + repeats * size:i + (repeats + 1) * size]] == block:
+                repeats += 1
+            # Only worth summarising when it saves at least a couple of lines
+            if repeats > 1 and (repeats - 1) * size >= 3:
+                result.extend(lines[i:i + size])
+                first = lines[i + size][0]
+                last = lines[i + repeats * size - 1][0]
+                result.append((None, f"... [lines {first}-{last}: previous {size} line(s) repeated {repeats - 1} more time(s)]"))
+                i += repeats * size
+                collapsed = True
+                break
+        if not collapsed:
+            result.append(lines[i])
+            i += 1
+    return result
+
+
+def _collapse_literals(lines: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    """Keep the first and last lines of long runs of literal data (tables, arrays, test vectors)."""
+    result = []
+    i = 0
+    while i < len(lines):
+        j = i
+        while j < len(lines) and _LITERAL_LINE.match(lines[j][1]):
+            j += 1
+        if j - i >= LITERAL_BLOCK_MIN_LINES:
+            result.append(lines[i])
+            result.append((None, f"... [lines {lines[i + 1][0]}-{lines[j - 2][0]}: {j - i - 2} lines of literal data omitted]"))
+            result.append(lines[j - 1])
+            i = j
+        else:
+            result.append(lines[i])
+            i += 1
+    return result
+
+
+def compact_code(code: str, language: str) -> List[Tuple[Optional[int], str]]:
+    """Return (original line number, text) pairs for the code with noise removed.
+
+    Summary lines inserted in place of omitted code have a line number of None.
+    """
+    stripped = strip_comments(code, language)
+    lines = []
+    for number, line in enumerate(stripped.split('\n'), start=1):
+        line = line.rstrip()
+        if not line.strip():
+            continue
+        if len(line) > MAX_LINE_CHARS:
+            line = line[:MAX_LINE_CHARS] + f" ... [{len(line) - MAX_LINE_CHARS} chars truncated]"
+        lines.append((number, line))
+    lines = _collapse_literals(lines)
+    return _collapse_repeats(lines)
+
+
+def render_numbered(lines: List[Tuple[Optional[int], str]]) -> str:
+    width = max((len(str(number)) for number, _ in lines if number is not None), default=1)
+    return '\n'.join(f"{'' if number is None else number:>{width}}| {text}" for number, text in lines)
+
+
+def choose_max_tokens(code_lines: int) -> int:
+    """Scale the review length with the size of the submission."""
+    return max(MIN_OUTPUT_TOKENS, min(MAX_OUTPUT_TOKENS, 400 + code_lines * 8))
+
+
+def build_evaluation_prompt(code: str, language: str, question: Optional[str] = None,
+                            context_window: int = CONTEXT_WINDOW_TOKENS,
+                            system_prompt: str = "") -> Tuple[str, int, Dict[str, Any]]:
+    """Build a compact, line-numbered review prompt that fits the context window.
+
+    Returns the prompt, the max output tokens to request, and token statistics.
+    Raises PromptTooLargeError when the compacted submission still does not fit.
+    """
+    lines = compact_code(code, language)
+    numbered = render_numbered(lines)
+
+    task = "Does it solve the problem?" if question else "What does it do?"
+    header = f"Review this {language} code"
+    if question:
+        header += f" for the problem:\n{question}\n"
+    prompt = f"""{header}
+CODE (original line numbers; comments, blank lines and long literal data removed):
+```{language}
+{numbered}
+```
+Cover briefly: 1. Correctness ({task}) 2. Efficiency 3. Code quality 4. Best practices 5. Suggestions.
+Reference line numbers where relevant. Do not grade on missing comments.
+Use Markdown (## headings, * bullets), no HTML.
+End with "Final Grade: X/10".
+"""
+    original_tokens = estimate_tokens(code)
+    prompt_tokens = estimate_tokens(prompt) + estimate_tokens(system_prompt)
+    max_tokens = choose_max_tokens(len(lines))
+
+    if prompt_tokens + max_tokens > context_window:
+        # Trade review length for input space before giving up
+        max_tokens = max(MIN_OUTPUT_TOKENS, context_window - prompt_tokens)
+        if prompt_tokens + max_tokens > context_window:
+            raise PromptTooLargeError(
+                f"Submission is too large to evaluate: about {prompt_tokens} tokens after compaction, "
+                f"but only {context_window - MIN_OUTPUT_TOKENS} are available. "
+                f"Please split the solution or remove embedded data."
+            )
+
+    stats = {
+        "code_tokens_original": original_tokens,
+        "prompt_tokens_estimate": prompt_tokens,
+        "max_tokens": max_tokens,
+        "lines_original": code.count('\n') + 1,
+        "lines_sent": len(lines)
+    }
+    return prompt, max_tokens, stats
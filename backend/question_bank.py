@@ -0,0 +1,229 @@
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import logging
+from typing import Dict, Any, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Questions whose SimHash fingerprints differ in at most this many bits are near-duplicates
+NEAR_DUPLICATE_DISTANCE = 3
+
+_WORD_PATTERN = re.compile(r'[a-z0-9]+')
+
+
+def simhash(text: str, shingle_size: int = 2) -> int:
+    """64-bit SimHash over word shingles of the normalized question text."""
+    words = _WORD_PATTERN.findall(text.lower())
+    shingles = [' '.join(words[i:i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))]
+    weights = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode(), digest_size=8).digest(), 'big')
+        for bit in range(64):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    value = 0
+    for bit in range(64):
+        if weights[bit] > 0:
+            value |= 1 << bit
+    # SQLite integers are signed 64-bit
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin((a ^ b) & 0xFFFFFFFFFFFFFFFF).count('1')
+
+
+def category_key(language: str, topic: str, difficulty: str) -> Tuple[str, str, str]:
+    return language.strip().lower(), topic.strip().lower(), difficulty.strip().lower()
+
+
+class QuestionBank:
+    """SQLite store of validated generated questions, indexed by category with full-text search."""
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS questions (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                language TEXT NOT NULL,
+                topic TEXT NOT NULL,
+                difficulty TEXT NOT NULL,
+                text TEXT NOT NULL,
+                simhash INTEGER NOT NULL,
+                created_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_questions_category ON questions (language, topic, difficulty);
+            CREATE TABLE IF NOT EXISTS served (
+                question_id INTEGER NOT NULL,
+                requester TEXT NOT NULL,
+                served_at REAL NOT NULL,
+                PRIMARY KEY (question_id, requester)
+            );
+        """)
+        self.fts_enabled = self._create_fts()
+
+    def _create_fts(self) -> bool:
+        try:
+            self.conn.executescript("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS questions_fts
+                    USING fts5(text, content='questions', content_rowid='id');
+                CREATE TRIGGER IF NOT EXISTS questions_fts_insert AFTER INSERT ON questions BEGIN
+                    INSERT INTO questions_fts (rowid, text) VALUES (new.id, new.text);
+                END;
+            """)
+            return True
+        except sqlite3.OperationalError as e:
+            logger.warning(f"SQLite FTS5 not available, falling back to LIKE search: {str(e)}")
+            return False
+
+    def add_questions(self, language: str, topic: str, difficulty: str, questions: List[str]) -> List[int]:
+        """Store questions, skipping near-duplicates of ones already in the category. Returns new ids."""
+        language, topic, difficulty = category_key(language, topic, difficulty)
+        added = []
+        with self.lock:
+            existing = [row["simhash"] for row in self.conn.execute(
+                "SELECT simhash FROM questions WHERE language = ? AND topic = ? AND difficulty = ?",
+                (language, topic, difficulty)
+            )]
+            self.conn.execute("BEGIN IMMEDIATE")
+            for text in questions:
+                text = text.strip()
+                fingerprint = simhash(text)
+                if any(hamming_distance(fingerprint, other) <= NEAR_DUPLICATE_DISTANCE for other in existing):
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT INTO questions (language, topic, difficulty, text, simhash, created_at) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (language, topic, difficulty, text, fingerprint, time.time())
+                )
+                existing.append(fingerprint)
+                added.append(cursor.lastrowid)
+            self.conn.execute("COMMIT")
+        return added
+
+    def find_ids(self, language: str, topic: str, difficulty: str, questions: List[str]) -> List[int]:
+        """Ids of stored questions that are near-duplicates of the given texts."""
+        language, topic, difficulty = category_key(language, topic, difficulty)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, simhash FROM questions WHERE language = ? AND topic = ? AND difficulty = ?",
+                (language, topic, difficulty)
+            ).fetchall()
+        ids = []
+        for text in questions:
+            fingerprint = simhash(text.strip())
+            for row in rows:
+                if hamming_distance(fingerprint, row["simhash"]) <= NEAR_DUPLICATE_DISTANCE:
+                    ids.append(row["id"])
+                    break
+        return ids
+
+    def count_unseen(self, language: str, topic: str, difficulty: str, requester: str) -> int:
+        language, topic, difficulty = category_key(language, topic, difficulty)
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT COUNT(*) AS n FROM questions q WHERE language = ? AND topic = ? AND difficulty = ? "
+                "AND NOT EXISTS (SELECT 1 FROM served s WHERE s.question_id = q.id AND s.requester = ?)",
+                (language, topic, difficulty, requester)
+            ).fetchone()
+        return row["n"]
+
+    def take(self, language: str, topic: str, difficulty: str, count: int, requester: str) -> Optional[List[str]]:
+        """Serve ``count`` questions the requester has not seen yet, or None if there are not enough."""
+        language, topic, difficulty = category_key(language, topic, difficulty)
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT id, text FROM questions q WHERE language = ? AND topic = ? AND difficulty = ? "
+                "AND NOT EXISTS (SELECT 1 FROM served s WHERE s.question_id = q.id AND s.requester = ?) "
+                "ORDER BY RANDOM() LIMIT ?",
+                (language, topic, difficulty, requester, count)
+            ).fetchall()
+            if len(rows) < count:
+                return None
+            self._mark_served_locked([row["id"] for row in rows], requester)
+        return [row["text"] for row in rows]
+
+    def mark_served(self, question_ids: List[int], requester: str):
+        with self.lock:
+            self._mark_served_locked(question_ids, requester)
+
+    def _mark_served_locked(self, question_ids: List[int], requester: str):
+        now = time.time()
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO served (question_id, requester, served_at) VALUES (?, ?, ?)",
+            [(question_id, requester, now) for question_id in question_ids]
+        )
+
+    def search(self, query: str, language: Optional[str] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Full-text search over question text, optionally restricted to one language."""
+        params = []
+        if self.fts_enabled:
+            # Quote each term so user input cannot inject FTS query syntax
+            terms = ' '.join(f'"{term}"' for term in _WORD_PATTERN.findall(query.lower()))
+            if not terms:
+                return []
+            sql = ("SELECT q.id, q.language, q.topic, q.difficulty, q.text FROM questions_fts f "
+                   "JOIN questions q ON q.id = f.rowid WHERE questions_fts MATCH ?")
+            params.append(terms)
+        else:
+            sql = "SELECT id, language, topic, difficulty, text FROM questions q WHERE text LIKE ?"
+            params.append(f"%{query}%")
+        if language:
+            sql += " AND q.language = ?"
+            params.append(language.strip().lower())
+        sql += " LIMIT ?"
+        params.append(limit)
+        with self.lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [dict(row) for row in rows]
+
+    def category_sizes(self) -> List[Dict[str, Any]]:
+        with self.lock:
+            rows = self.conn.execute(
+                "SELECT language, topic, difficulty, COUNT(*) AS questions FROM questions "
+                "GROUP BY language, topic, difficulty"
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+
+class QuestionRefiller:
+    """Tops up thin categories in the background by calling the generator off the request path."""
+
+    def __init__(self, bank: QuestionBank, generate, min_questions: int = 20, batch_size: int = 10):
+        self.bank = bank
+        self.generate = generate
+        self.min_questions = min_questions
+        self.batch_size = batch_size
+        self.in_flight = set()
+        self.lock = threading.Lock()
+
+    def request_refill(self, language: str, topic: str, difficulty: str, requester: str):
+        """Start a background refill if the requester has fewer than min_questions unseen questions left."""
+        if self.bank.count_unseen(language, topic, difficulty, requester) >= self.min_questions:
+            return
+        key = category_key(language, topic, difficulty)
+        with self.lock:
+            if key in self.in_flight:
+                return
+            self.in_flight.add(key)
+        thread = threading.Thread(target=self._refill, args=(language, topic, difficulty), daemon=True,
+                                  name=f"question-refill-{key[0]}")
+        thread.start()
+
+    def _refill(self, language: str, topic: str, difficulty: str):
+        try:
+            result = self.generate(language, topic, difficulty, self.batch_size)
+            if result.get("success"):
+                added = self.bank.add_questions(language, topic, difficulty, result["questions"])
+                logger.info(f"Refilled question bank for {language}/{topic}/{difficulty} with {len(added)} new question(s)")
+        except Exception as e:
+            logger.error(f"Question bank refill failed: {str(e)}")
+        finally:
+            with self.lock:
+                self.in_flight.discard(category_key(language, topic, difficulty))
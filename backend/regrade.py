@@ -0,0 +1,281 @@
+"""Bulk regrade of an assignment's submissions.
+
+Reads a JSONL export (one answer per line, or one submission per line with
+an ``answers`` map and ``languages`` map), dedupes identical code, runs every
+unique answer through a process pool for execution and a rate-limited thread
+pool for LLM review, and streams graded rows to an output JSONL file.
+Rows already in the output file are skipped, so an interrupted run resumes;
+answers whose execution raised or whose review failed (unless the evaluator
+marked it not retryable) are not written, so the next run retries them:
+
+    python regrade.py submissions.jsonl regraded.jsonl --tests tests.json --workers 8 --llm-rate 2
+"""
+import argparse
+import hashlib
+import json
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, Iterator, List
+
+from log_config import setup_logging
+
+os.environ.setdefault("LOG_LEVEL", "ERROR")
+# Each worker process imports compile.py; skip its startup warmup runs
+os.environ.setdefault("COMPILE_WARMUP", "0")
+
+COMPILE_SERVICE_URL = os.environ.get("COMPILE_SERVICE_URL", "http://localhost:5002/compile")
+
+_compile_service = None
+
+
+def _execute(code: str, language: str, stdin: str, test_cases):
+    """Process-pool entry point: run one answer through the compile service code in-process."""
+    global _compile_service
+    if _compile_service is None:
+        import compile as compile_service
+        _compile_service = compile_service
+    result = _compile_service.execute_code(code, language, stdin, test_cases)
+    result.pop("original_code", None)
+    return result
+
+
+class RateLimiter:
+    """Token bucket shared by the LLM review threads."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+def read_answers(path: str, tests: Dict[str, Any]) -> Iterator[Dict[str, Any]]:
+    """Yield one answer dict per graded item, expanding whole-submission records."""
+    with open(path) as f:
+        for line_number, line in enumerate(f, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            record = json.loads(line)
+            if isinstance(record.get("answers"), dict):
+                owner = record.get("submittedBy") or record.get("id") or f"line{line_number}"
+                languages = record.get("languages", {})
+                for question, code in record["answers"].items():
+                    yield {
+                        "id": f"{owner}:{question}",
+                        "submittedBy": owner,
+                        "question": question,
+                        "code": code or "",
+                        "language": languages.get(question, "python"),
+                        "stdin": "",
+                        "test_cases": tests.get(question)
+                    }
+            else:
+                question = record.get("question", "")
+                yield {
+                    "id": record.get("id") or f"line{line_number}",
+                    "submittedBy": record.get("submittedBy"),
+                    "question": question,
+                    "code": record.get("code", ""),
+                    "language": record.get("language", "python"),
+                    "stdin": record.get("stdin", ""),
+                    "test_cases": record.get("test_cases") or tests.get(question)
+                }
+
+
+def dedupe_key(answer: Dict[str, Any]) -> str:
+    """Identical code for the same question, language and tests grades identically."""
+    code = '\n'.join(line.rstrip() for line in answer["code"].strip().split('\n'))
+    material = json.dumps([answer["language"], answer["question"], code, answer["stdin"], answer["test_cases"]])
+    return hashlib.sha256(material.encode()).hexdigest()
+
+
+def load_checkpoint(path: str) -> set:
+    done = set()
+    if os.path.exists(path):
+        with open(path) as f:
+            for line in f:
+                try:
+                    done.add(json.loads(line)["id"])
+                except (ValueError, KeyError):
+                    # A torn final line from an interrupted run; that item is regraded
+                    continue
+    return done
+
+
+class Regrader:
+    def __init__(self, output_path: str, workers: int, llm_concurrency: int, llm_rate: float, use_llm: bool,
+                 evaluator=None):
+        self.output_path = output_path
+        self.workers = workers
+        self.llm_concurrency = llm_concurrency
+        self.limiter = RateLimiter(llm_rate, burst=llm_concurrency)
+        self.use_llm = use_llm
+        self.grader = None
+        # Built in run() from the OpenRouter configuration unless one is given
+        self.evaluator = evaluator
+        self.write_lock = threading.Lock()
+        self.completed = 0
+        self.failed = 0
+        self.total = 0
+        self.start = time.monotonic()
+        self.last_report = 0.0
+
+    def _review(self, answer: Dict[str, Any]) -> Dict[str, Any]:
+        self.limiter.acquire()
+        return self.evaluator.evaluate_code(answer["code"], answer["language"], answer["question"])
+
+    def _needs_review(self, answer: Dict[str, Any], execution: Dict[str, Any]) -> bool:
+        if not self.use_llm:
+            return False
+        if answer["test_cases"]:
+            # No review when the grade is already decided
+            return self.grader.needs_review(execution)
+        return True
+
+    def _grade(self, answer: Dict[str, Any], execution: Dict[str, Any], review) -> Dict[str, Any]:
+        if answer["test_cases"]:
+            result = self.grader.grade_execution(answer["code"], answer["language"], answer["question"],
+                                                 execution, review=review or {}, use_llm=self.use_llm)
+        elif review is not None:
+            result = dict(review)
+        else:
+            result = {"success": execution.get("success", False), "grade": None,
+                      "review": "Executed only; no test cases and LLM review disabled."}
+        result["execution"] = execution
+        return result
+
+    def _write(self, out, answers: List[Dict[str, Any]], result: Dict[str, Any]):
+        with self.write_lock:
+            for answer in answers:
+                row = dict(result, id=answer["id"], submittedBy=answer["submittedBy"], question=answer["question"],
+                           language=answer["language"], deduplicated=len(answers) > 1)
+                out.write(json.dumps(row) + "\n")
+            out.flush()
+            self.completed += len(answers)
+        self._report()
+
+    def _report(self, force: bool = False):
+        now = time.monotonic()
+        if not force and now - self.last_report < 2:
+            return
+        self.last_report = now
+        elapsed = now - self.start
+        rate = self.completed / elapsed if elapsed else 0.0
+        remaining = self.total - self.completed - self.failed
+        eta = f"{remaining / rate:.0f}s" if rate else "?"
+        failed = f", {self.failed} failed" if self.failed else ""
+        print(f"[regrade] {self.completed}/{self.total} answers{failed}, {rate:.1f}/s, ETA {eta}",
+              file=sys.stderr, flush=True)
+
+    def run(self, answers: List[Dict[str, Any]]) -> int:
+        """Grade answers, appending rows to the output file; returns how many failed and were not written."""
+        groups = {}
+        for answer in answers:
+            groups.setdefault(dedupe_key(answer), []).append(answer)
+        self.total = len(answers)
+        print(f"[regrade] {len(answers)} answers to grade, {len(groups)} unique", file=sys.stderr, flush=True)
+
+        if self.use_llm or any(a["test_cases"] for a in answers):
+            from hybrid_grader import HybridGrader
+            if self.evaluator is None:
+                from code_evaluator import CodeEvaluator, OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_ROUTES
+                self.evaluator = CodeEvaluator(OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_ROUTES,
+                                               max_workers=self.llm_concurrency * len(OPENROUTER_ROUTES))
+            self.grader = HybridGrader(self.evaluator, COMPILE_SERVICE_URL)
+
+        if os.path.exists(self.output_path) and os.path.getsize(self.output_path):
+            with open(self.output_path, 'rb') as f:
+                f.seek(-1, os.SEEK_END)
+                torn = f.read(1) != b"\n"
+            if torn:
+                # Terminate a torn final line so new rows start on their own line
+                with open(self.output_path, 'a') as out:
+                    out.write("\n")
+
+        # Spawned workers start clean rather than forking this process's router and reviewer threads
+        with open(self.output_path, 'a') as out, \
+                ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")) as processes, \
+                ThreadPoolExecutor(max_workers=self.llm_concurrency) as reviewers:
+            pending = {}
+            for key, group in groups.items():
+                first = group[0]
+                future = processes.submit(_execute, first["code"], first["language"], first["stdin"], first["test_cases"])
+                pending[future] = ("execute", key, None)
+
+            while pending:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage, key, execution = pending.pop(future)
+                    group = groups[key]
+                    try:
+                        value = future.result()
+                        if stage == "review" and value.get("success") is False and value.get("retryable", True):
+                            # evaluate_code reports upstream failures instead of raising
+                            raise RuntimeError(value.get("error", "review failed"))
+                    except Exception as e:
+                        # Not written to the checkpoint, so a resumed run retries these answers
+                        print(f"[regrade] {stage} failed for {group[0]['id']}: {str(e)}", file=sys.stderr, flush=True)
+                        self.failed += len(group)
+                        continue
+                    if stage == "execute":
+                        if self._needs_review(group[0], value):
+                            pending[reviewers.submit(self._review, group[0])] = ("review", key, value)
+                        else:
+                            self._write(out, group, self._grade(group[0], value, None))
+                    else:
+                        self._write(out, group, self._grade(group[0], execution, value))
+        self._report(force=True)
+        return self.failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk regrade an assignment export")
+    parser.add_argument("input", help="JSONL export of submissions")
+    parser.add_argument("output", help="JSONL file to append graded rows to (also the checkpoint)")
+    parser.add_argument("--tests", help="JSON file mapping question text to a list of test cases")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 4, help="execution processes")
+    parser.add_argument("--llm-concurrency", type=int, default=8, help="concurrent LLM reviews")
+    parser.add_argument("--llm-rate", type=float, default=2.0, help="LLM requests per second")
+    parser.add_argument("--no-llm", action="store_true", help="grade from test cases only")
+    args = parser.parse_args()
+
+    tests = {}
+    if args.tests:
+        with open(args.tests) as f:
+            tests = json.load(f)
+
+    done = load_checkpoint(args.output)
+    answers = [a for a in read_answers(args.input, tests) if a["id"] not in done and a["code"].strip()]
+    if done:
+        print(f"[regrade] resuming: {len(done)} answers already graded", file=sys.stderr)
+    if not answers:
+        print("[regrade] nothing to do", file=sys.stderr)
+        return
+
+    setup_logging("regrade")
+    failed = Regrader(args.output, args.workers, args.llm_concurrency, args.llm_rate, not args.no_llm).run(answers)
+    if failed:
+        print(f"[regrade] {failed} answers failed; run again to retry them", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
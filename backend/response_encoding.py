@@ -0,0 +1,71 @@
+import gzip
+import logging
+from typing import Dict, Any
+
+from flask import request, jsonify, Response
+
+logger = logging.getLogger(__name__)
+
+# Responses smaller than this are not worth the compression CPU
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+# Optional encoders, used only when installed
+encoders_available = {
+    'brotli': False,
+    'msgpack': False
+}
+
+try:
+    import brotli
+    encoders_available['brotli'] = True
+except ImportError:
+    logger.info("brotli not available. Responses will be gzip-compressed only.")
+
+try:
+    import msgpack
+    encoders_available['msgpack'] = True
+except ImportError:
+    logger.info("msgpack not available. Responses will be JSON only.")
+
+
+def encode_response(data: Dict[str, Any]) -> Response:
+    """JSON by default; MessagePack when the client asks for it and msgpack is installed."""
+    if encoders_available['msgpack'] and 'application/msgpack' in request.headers.get('Accept', ''):
+        return Response(msgpack.packb(data, use_bin_type=True), mimetype='application/msgpack')
+    return jsonify(data)
+
+
+def _choose_encoding(accept_encoding: str):
+    accepted = {part.split(';')[0].strip() for part in accept_encoding.split(',')}
+    if 'br' in accepted and encoders_available['brotli']:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def init_compression(app, min_bytes: int = COMPRESS_MIN_BYTES):
+    """Compress response bodies above min_bytes with brotli or gzip, per Accept-Encoding."""
+
+    @app.after_request
+    def _compress(response):
+        if (response.direct_passthrough or response.status_code < 200 or response.status_code >= 300
+                or 'Content-Encoding' in response.headers):
+            return response
+        encoding = _choose_encoding(request.headers.get('Accept-Encoding', ''))
+        if encoding is None:
+            return response
+        body = response.get_data()
+        if len(body) < min_bytes:
+            return response
+        if encoding == 'br':
+            compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+        else:
+            compressed = gzip.compress(body, compresslevel=GZIP_LEVEL)
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        response.headers['Content-Length'] = str(len(compressed))
+        response.vary.add('Accept-Encoding')
+        return response
@@ -0,0 +1,259 @@
+import hashlib
+import json
+import random
+import re
+import sqlite3
+import threading
+import time
+import logging
+from collections import defaultdict
+from typing import Dict, Any, List, Optional, Tuple
+
+from prompt_builder import strip_comments
+
+logger = logging.getLogger(__name__)
+
+# Same language keys as LANGUAGE_CONFIG in compile.py
+LANGUAGE_KEYWORDS = {
+    "python": {
+        "False", "None", "True", "and", "as", "assert", "async", "await", "break", "class", "continue",
+        "def", "del", "elif", "else", "except", "finally", "for", "from", "global", "if", "import", "in",
+        "is", "lambda", "nonlocal", "not", "or", "pass", "raise", "return", "try", "while", "with", "yield",
+        "print", "range", "len", "input", "int", "str", "list", "dict", "set"
+    },
+    "javascript": {
+        "break", "case", "catch", "class", "const", "continue", "debugger", "default", "delete", "do",
+        "else", "export", "extends", "finally", "for", "function", "if", "import", "in", "instanceof",
+        "let", "new", "return", "super", "switch", "this", "throw", "try", "typeof", "var", "void",
+        "while", "with", "yield", "async", "await", "of", "null", "undefined", "true", "false", "console"
+    },
+    "java": {
+        "abstract", "boolean", "break", "byte", "case", "catch", "char", "class", "continue", "default",
+        "do", "double", "else", "extends", "final", "finally", "float", "for", "if", "implements",
+        "import", "instanceof", "int", "interface", "long", "new", "private", "protected", "public",
+        "return", "short", "static", "super", "switch", "this", "throw", "throws", "try", "void",
+        "while", "null", "true", "false", "String", "System"
+    },
+    "c": {
+        "auto", "break", "case", "char", "const", "continue", "default", "do", "double", "else", "enum",
+        "extern", "float", "for", "goto", "if", "int", "long", "register", "return", "short", "signed",
+        "sizeof", "static", "struct", "switch", "typedef", "union", "unsigned", "void", "volatile",
+        "while", "include", "printf", "scanf", "malloc", "free", "NULL"
+    },
+    "cpp": {
+        "auto", "bool", "break", "case", "catch", "char", "class", "const", "continue", "default",
+        "delete", "do", "double", "else", "enum", "false", "float", "for", "if", "include", "int", "long",
+        "namespace", "new", "nullptr", "private", "protected", "public", "return", "short", "sizeof",
+        "static", "std", "struct", "switch", "template", "this", "throw", "true", "try", "typename",
+        "using", "void", "while", "cout", "cin", "endl", "vector", "string"
+    }
+}
+
+_TOKEN_PATTERN = re.compile(
+    r'(?P<string>"(?:[^"\\\n]|\\.)*"|\'(?:[^\'\\\n]|\\.)*\'|`[^`]*`)'
+    r'|(?P<number>\d+(?:\.\d+)?)'
+    r'|(?P<name>[A-Za-z_]\w*)'
+    r'|(?P<op>[^\s\w])'
+)
+
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def tokenize(code: str, language: str) -> List[Tuple[str, int]]:
+    """Normalized (token, line) pairs: comments dropped, identifiers/literals replaced by placeholders."""
+    keywords = LANGUAGE_KEYWORDS.get(language, set())
+    code = strip_comments(code, language)
+    tokens = []
+    line = 1
+    position = 0
+    for match in _TOKEN_PATTERN.finditer(code):
+        line += code.count('\n', position, match.start())
+        position = match.start()
+        kind = match.lastgroup
+        text = match.group(0)
+        if kind == "string":
+            tokens.append(("S", line))
+        elif kind == "number":
+            tokens.append(("N", line))
+        elif kind == "name":
+            tokens.append((text if text in keywords else "V", line))
+        else:
+            tokens.append((text, line))
+    return tokens
+
+
+def winnow(tokens: List[Tuple[str, int]], k: int = 5, window: int = 4) -> List[Tuple[int, int, int]]:
+    """Winnowed k-gram fingerprints as (hash, first line, last line)."""
+    if len(tokens) < k:
+        return []
+    grams = []
+    for i in range(len(tokens) - k + 1):
+        text = ' '.join(token for token, _ in tokens[i:i + k])
+        h = int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'big') >> 1
+        grams.append((h, tokens[i][1], tokens[i + k - 1][1]))
+
+    selected = {}
+    for i in range(max(1, len(grams) - window + 1)):
+        chunk = grams[i:i + window]
+        # Rightmost minimum, per the winnowing paper, so equal hashes are not re-selected
+        best = min(range(len(chunk)), key=lambda j: (chunk[j][0], -j))
+        selected[i + best] = chunk[best]
+    return [selected[i] for i in sorted(selected)]
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME)) for _ in range(num_perm)]
+
+    def signature(self, hashes) -> List[int]:
+        hashes = list(hashes)
+        if not hashes:
+            return [_MERSENNE_PRIME] * len(self.params)
+        return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.params]
+
+
+def _merge_ranges(ranges: List[Tuple[int, int]]) -> List[List[int]]:
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+class AssignmentIndex:
+    """In-memory LSH index over one assignment's submissions."""
+
+    def __init__(self, bands: int, rows: int):
+        self.bands = bands
+        self.rows = rows
+        self.buckets = [defaultdict(set) for _ in range(bands)]
+        self.fingerprints = {}
+        self.signatures = {}
+
+    def add(self, submission_id: str, signature: List[int], fingerprints: List[Tuple[int, int, int]]):
+        for band in range(self.bands):
+            key = tuple(signature[band * self.rows:(band + 1) * self.rows])
+            self.buckets[band][key].add(submission_id)
+        self.fingerprints[submission_id] = fingerprints
+        self.signatures[submission_id] = signature
+
+    def remove(self, submission_id: str, signature: List[int]):
+        """Take a submission out of the buckets its signature hashed to."""
+        for band in range(self.bands):
+            key = tuple(signature[band * self.rows:(band + 1) * self.rows])
+            bucket = self.buckets[band].get(key)
+            if bucket is not None:
+                bucket.discard(submission_id)
+                if not bucket:
+                    del self.buckets[band][key]
+        self.fingerprints.pop(submission_id, None)
+        self.signatures.pop(submission_id, None)
+
+    def candidates(self, signature: List[int]) -> set:
+        found = set()
+        for band in range(self.bands):
+            key = tuple(signature[band * self.rows:(band + 1) * self.rows])
+            found |= self.buckets[band].get(key, set())
+        return found
+
+
+class SimilarityIndex:
+    """Incremental near-duplicate detection across the submissions of each assignment.
+
+    Submissions are tokenized with identifiers and literals normalized, reduced
+    to winnowed fingerprints, and bucketed by MinHash-LSH so a query only
+    compares against likely matches rather than every other submission.
+    Fingerprints are persisted in SQLite and loaded per assignment on first use.
+    """
+
+    def __init__(self, db_path: str, num_perm: int = 64, bands: int = 16, threshold: float = 0.5):
+        if num_perm % bands:
+            raise ValueError("num_perm must be divisible by bands")
+        self.hasher = MinHasher(num_perm)
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.threshold = threshold
+        self.indexes = {}
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                assignment_id TEXT NOT NULL,
+                submission_id TEXT NOT NULL,
+                language TEXT NOT NULL,
+                signature TEXT NOT NULL,
+                fingerprints TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                PRIMARY KEY (assignment_id, submission_id)
+            );
+        """)
+
+    def _index_for(self, assignment_id: str) -> AssignmentIndex:
+        index = self.indexes.get(assignment_id)
+        if index is None:
+            index = AssignmentIndex(self.bands, self.rows)
+            for row in self.conn.execute(
+                "SELECT submission_id, signature, fingerprints FROM fingerprints WHERE assignment_id = ?",
+                (assignment_id,)
+            ):
+                index.add(row["submission_id"], json.loads(row["signature"]),
+                          [tuple(f) for f in json.loads(row["fingerprints"])])
+            self.indexes[assignment_id] = index
+        return index
+
+    def add_submission(self, assignment_id: str, submission_id: str, code: str, language: str) -> List[Dict[str, Any]]:
+        """Index a submission (replacing any previous version) and return its near-duplicates."""
+        fingerprints = winnow(tokenize(code, language))
+        signature = self.hasher.signature({h for h, _, _ in fingerprints})
+        with self.lock:
+            index = self._index_for(assignment_id)
+            if submission_id in index.signatures:
+                # Resubmission: drop only the previous version's bucket entries
+                index.remove(submission_id, index.signatures[submission_id])
+            matches = self._matches(index, submission_id, signature, fingerprints)
+            self.conn.execute(
+                "INSERT OR REPLACE INTO fingerprints (assignment_id, submission_id, language, signature, fingerprints, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (assignment_id, submission_id, language, json.dumps(signature), json.dumps(fingerprints), time.time())
+            )
+            index.add(submission_id, signature, fingerprints)
+        return matches
+
+    def query(self, assignment_id: str, submission_id: str) -> Optional[List[Dict[str, Any]]]:
+        """Near-duplicates of an already indexed submission, or None if it is unknown."""
+        with self.lock:
+            index = self._index_for(assignment_id)
+            fingerprints = index.fingerprints.get(submission_id)
+            if fingerprints is None:
+                return None
+            return self._matches(index, submission_id, index.signatures[submission_id], fingerprints)
+
+    def _matches(self, index: AssignmentIndex, submission_id: str, signature: List[int],
+                 fingerprints: List[Tuple[int, int, int]]) -> List[Dict[str, Any]]:
+        mine = defaultdict(list)
+        for h, start, end in fingerprints:
+            mine[h].append((start, end))
+
+        matches = []
+        for other_id in index.candidates(signature) - {submission_id}:
+            theirs = defaultdict(list)
+            for h, start, end in index.fingerprints[other_id]:
+                theirs[h].append((start, end))
+            shared = mine.keys() & theirs.keys()
+            union = len(mine.keys() | theirs.keys())
+            similarity = len(shared) / union if union else 0.0
+            if similarity < self.threshold:
+                continue
+            matches.append({
+                "submission_id": other_id,
+                "similarity": round(similarity, 3),
+                "lines": _merge_ranges([r for h in shared for r in mine[h]]),
+                "other_lines": _merge_ranges([r for h in shared for r in theirs[h]])
+            })
+        matches.sort(key=lambda m: m["similarity"], reverse=True)
+        return matches
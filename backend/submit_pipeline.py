@@ -0,0 +1,144 @@
+import contextvars
+import time
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, Iterator, List
+
+import requests
+
+from log_config import trace_headers
+from profiling import profile_job_context, profile_thread, timed_wait
+
+logger = logging.getLogger(__name__)
+
+
+def _elapsed_ms(start: float) -> float:
+    return round((time.monotonic() - start) * 1000, 1)
+
+
+class SubmitPipeline:
+    """Run execution and LLM review for every answer of a submission concurrently.
+
+    Each answer's compile/run call and its LLM evaluation start at the same
+    time, so the submit latency is bounded by the slowest stage rather than the
+    sum of all stages across both services. With a job_queue, reviews are
+    queued as durable "review" jobs (run by the queue's WorkerPool) and this
+    pipeline only waits for them; otherwise the evaluator is called in-process.
+    """
+
+    def __init__(self, evaluator, grader, compile_url: str, max_workers: int = 16, compile_timeout: float = 60,
+                 job_queue=None, review_timeout: float = 90):
+        self.evaluator = evaluator
+        self.grader = grader
+        self.compile_url = compile_url
+        self.compile_timeout = compile_timeout
+        self.job_queue = job_queue
+        self.review_timeout = review_timeout
+        # Answers and stages get separate pools so an answer never waits on a stage queued behind it
+        self.answer_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="submit-answer")
+        self.stage_executor = ThreadPoolExecutor(max_workers=max_workers * 2, thread_name_prefix="submit-stage")
+        # Pooled keep-alive connections to the compile service
+        self.session = requests.Session()
+
+    def _execute(self, answer: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.monotonic()
+        try:
+            with timed_wait("compile"):
+                response = self.session.post(
+                    self.compile_url,
+                    json={
+                        "code": answer["code"],
+                        "language": answer["language"],
+                        "stdin": answer.get("stdin", ""),
+                        "test_cases": answer.get("test_cases")
+                    },
+                    headers=trace_headers(),
+                    timeout=self.compile_timeout
+                )
+            response.raise_for_status()
+            execution = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Compile stage failed: {str(e)}")
+            # Not the submission's fault: grade from the review alone, as HybridGrader.grade does
+            execution = {"success": False, "error": f"Compile service request failed: {str(e)}",
+                         "transport_error": True}
+        execution["elapsed_ms"] = _elapsed_ms(start)
+        return execution
+
+    def _review(self, answer: Dict[str, Any], job_id: str = None) -> Dict[str, Any]:
+        start = time.monotonic()
+        if job_id is None:
+            review = self.evaluator.evaluate_code(answer["code"], answer["language"], answer.get("question", ""))
+        else:
+            job = self.job_queue.wait_for(job_id, self.review_timeout)
+            if job["status"] == "done" or (job["status"] == "failed" and job["result"]):
+                review = dict(job["result"])
+            else:
+                error = job["error"] if job["status"] == "failed" else f"review still {job['status']}"
+                review = {"success": False, "error": error, "grade": 0, "result": "error",
+                          "review": "Failed to evaluate code. Please try again later."}
+            review["review_job_id"] = job_id
+        review["elapsed_ms"] = _elapsed_ms(start)
+        return review
+
+    def _enqueue_review(self, answer: Dict[str, Any], job_payload: Dict[str, Any]):
+        if self.job_queue is None:
+            return None
+        return self.job_queue.enqueue("review", dict(job_payload, code=answer["code"], language=answer["language"],
+                                                     question=answer.get("question", "")))
+
+    def _stage(self, label: str, stage, *args):
+        # Stage threads are profiled as parts of the submitting request's profile, if any
+        with profile_thread(profile_job_context(), label):
+            return stage(*args)
+
+    def run_answer(self, answer: Dict[str, Any], job_payload: Dict[str, Any] = None) -> Dict[str, Any]:
+        """Grade one answer; job_payload carries request context (trace id, profile) into queued review jobs."""
+        job_payload = job_payload or {}
+        with profile_thread(job_payload.get("profile"), "submit-answer"):
+            return self._run_answer(answer, job_payload)
+
+    def _run_answer(self, answer: Dict[str, Any], job_payload: Dict[str, Any]) -> Dict[str, Any]:
+        start = time.monotonic()
+        review_job_id = self._enqueue_review(answer, job_payload)
+        # Copy the context per task so stage logs keep the submission's trace id
+        execution_future = self.stage_executor.submit(contextvars.copy_context().run, self._stage,
+                                                      "submit-execute", self._execute, answer)
+        review_future = self.stage_executor.submit(contextvars.copy_context().run, self._stage,
+                                                   "submit-review", self._review, answer, review_job_id)
+
+        execution = execution_future.result()
+        # The answer text is already part of the submission; do not echo it back
+        execution.pop("original_code", None)
+        if (answer.get("test_cases") and not execution.get("transport_error")
+                and not self.grader.needs_review(execution)):
+            # Failed to compile or failed every test: the grade is deterministic, so never wait for
+            # the review; cancel it if it has not started yet
+            if review_job_id is None:
+                review_future.cancel()
+            else:
+                self.job_queue.cancel(review_job_id)
+            review = None
+            result = self.grader.grade_execution(answer["code"], answer["language"], answer.get("question"), execution, review={})
+        else:
+            review = review_future.result()
+            if answer.get("test_cases") and not execution.get("transport_error"):
+                result = self.grader.grade_execution(answer["code"], answer["language"], answer.get("question"), execution, review=review)
+            else:
+                result = dict(review)
+
+        result["question"] = answer.get("question", "")
+        result["execution"] = execution
+        result["timings"] = {
+            "compile_ms": execution.get("elapsed_ms"),
+            "evaluate_ms": review.get("elapsed_ms") if review else None,
+            "total_ms": _elapsed_ms(start)
+        }
+        return result
+
+    def run(self, answers: List[Dict[str, Any]], job_payload: Dict[str, Any] = None) -> Iterator[Dict[str, Any]]:
+        """Yield per-answer results in completion order."""
+        futures = [self.answer_executor.submit(contextvars.copy_context().run, self.run_answer, answer, job_payload)
+                   for answer in answers]
+        for future in as_completed(futures):
+            yield future.result()
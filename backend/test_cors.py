@@ -1,18 +1,29 @@
-from flask import Flask, request, jsonify
+from flask import Flask, request, jsonify, Response, stream_with_context
 from flask_cors import CORS
-import requests
 import json
+import math
 import os
-import re
-from typing import Dict, Any, Optional
+from typing import Dict, Any
 import logging
-import html
+import time
+import uuid
 
-# Configure logging
-logging.basicConfig(level=logging.DEBUG)
+from code_evaluator import CodeEvaluator, OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_ROUTES
+from hybrid_grader import HybridGrader
+from job_queue import JobQueue, WorkerPool
+from log_config import setup_logging, init_app, Redacted, current_trace_id, is_sampled, trace_context
+from profiling import init_profiling, profile_job_context, profile_thread
+from question_bank import QuestionBank, QuestionRefiller
+from similarity import SimilarityIndex
+from submit_pipeline import SubmitPipeline
+
+# Structured, queue-backed logging; full debug detail only for sampled requests
+setup_logging("evaluate")
 logger = logging.getLogger(__name__)
 
 app = Flask(__name__)
+init_app(app, sample_rates={"/evaluate": 0.05, "/submit": 0.05, "/health": 0.0})
+init_profiling(app, "evaluate")
 CORS(app, resources={
     r"/evaluate": {
         "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
@@ -23,374 +34,121 @@ CORS(app, resources={
         "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
         "methods": ["POST", "OPTIONS"],
         "allow_headers": ["Content-Type"]
+    },
+    r"/submit": {
+        "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
+        "methods": ["POST", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/questions/*": {
+        "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
+        "methods": ["GET", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/similarity/*": {
+        "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
+        "methods": ["GET", "POST", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
+    },
+    r"/jobs/*": {
+        "origins": ["http://localhost:3000", "http://127.0.0.1:3000"],
+        "methods": ["GET", "POST", "OPTIONS"],
+        "allow_headers": ["Content-Type"]
     }
 })
 
-# OpenRouter API configuration
-OPENROUTER_API_KEY = "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"
-OPENROUTER_MODEL = "meta-llama/llama-4-maverick:free"
-
-class CodeEvaluator:
-    def __init__(self, api_key: str, model: str = "meta-llama/llama-4-maverick:free"):
-        self.api_key = api_key
-        self.model = model
-        self.api_url = "https://openrouter.ai/api/v1/chat/completions"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json",
-            "HTTP-Referer": "https://localhost:5001",
-            "X-Title": "Code Evaluation Tool"
-        }
+# Local compile service used to run submissions against test cases
+COMPILE_SERVICE_URL = os.environ.get("COMPILE_SERVICE_URL", "http://localhost:5002/compile")
 
-    def evaluate_code(self, code: str, language: str, question: Optional[str] = None) -> Dict[str, Any]:
-        prompt = self._build_evaluation_prompt(code, language, question)
-        
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": "You are a code evaluation expert. Analyze code for correctness, efficiency, and best practices."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 1500,
-            "temperature": 0.1
-        }
-        
-        logger.debug(f"Sending request to {self.api_url}")
-        logger.debug(f"Headers: {self.headers}")
-        logger.debug(f"Payload: {json.dumps(payload, indent=2)}")
-        
-        try:
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-            
-            logger.debug(f"Response status code: {response.status_code}")
-            
-            response_json = None
-            try:
-                response_json = response.json()
-                logger.debug(f"Response JSON: {json.dumps(response_json, indent=2)}")
-            except Exception as e:
-                logger.error(f"Failed to parse JSON response: {str(e)}")
-                logger.debug(f"Response content: {response.text}")
-            
-            response.raise_for_status()
-            
-            if response_json and "choices" in response_json and len(response_json["choices"]) > 0:
-                evaluation = response_json["choices"][0]["message"]["content"]
-                
-                plain_text_evaluation = self._convert_html_to_text(evaluation)
-                
-                grade = self._extract_grade(evaluation)
-                if grade is None:
-                    grade = self._calculate_grade(evaluation)
-                
-                return {
-                    "success": True,
-                    "evaluation": plain_text_evaluation,
-                    "grade": grade,
-                    "result": "success",
-                    "review": plain_text_evaluation
-                }
-            else:
-                error_msg = "No evaluation returned from API"
-                if response_json:
-                    error_msg += f": {json.dumps(response_json)}"
-                logger.error(error_msg)
-                
-                return {
-                    "success": False,
-                    "error": error_msg,
-                    "grade": 0,
-                    "result": "error",
-                    "review": "Failed to evaluate code. Please try again later."
-                }
-                
-        except requests.exceptions.RequestException as e:
-            error_msg = f"API request failed: {str(e)}"
-            logger.error(error_msg)
-            
-            return {
-                "success": False,
-                "error": error_msg,
-                "grade": 0,
-                "result": "error",
-                "review": "API request failed. Please check your connection or try again later."
-            }
-            
-        except Exception as e:
-            error_msg = f"Unexpected error during evaluation: {str(e)}"
-            logger.error(error_msg)
-            
-            return {
-                "success": False,
-                "error": error_msg,
-                "grade": 0,
-                "result": "error",
-                "review": "An unexpected error occurred. Please try again later."
-            }
+# Durable evaluation queue configuration
+EVALUATION_QUEUE_DB = os.environ.get(
+    "EVALUATION_QUEUE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "evaluation_jobs.db")
+)
+# Job workers run every LLM review (/evaluate, /jobs/bulk and /submit), so this bounds LLM concurrency
+EVALUATION_WORKERS = int(os.environ.get("EVALUATION_WORKERS", "16"))
+# Answers /submit grades concurrently (each runs a compile stage and waits for its review job)
+SUBMIT_WORKERS = int(os.environ.get("SUBMIT_WORKERS", "16"))
+# Concurrent question generation calls (request path plus background refills)
+QUESTION_GENERATION_CALLERS = 4
+# One router thread per concurrent LLM caller and route, so hedges never queue behind other calls
+ROUTER_WORKERS = (EVALUATION_WORKERS + QUESTION_GENERATION_CALLERS) * len(OPENROUTER_ROUTES)
+# How long a synchronous /evaluate call waits before handing back a job id instead
+EVALUATE_WAIT_SECONDS = 90
 
-    def generate_questions(self, language: str, topic: str, difficulty: str, num_questions: int) -> Dict[str, Any]:
-        prompt = f"""
-Generate {num_questions} programming questions for {language} on the topic of {topic} with {difficulty} difficulty level.
-Each question should be concise (max 200 characters) and suitable for a coding assignment.
-Return the questions as a JSON array of strings, e.g., ["question1", "question2", ...].
-Ensure questions are clear, specific, and test relevant concepts for the given topic and difficulty.
-"""
-        
-        payload = {
-            "model": self.model,
-            "messages": [
-                {"role": "system", "content": "You are a programming question generator. Create clear and concise coding questions in JSON format."},
-                {"role": "user", "content": prompt}
-            ],
-            "max_tokens": 1000,
-            "temperature": 0.3
-        }
-        
-        try:
-            response = requests.post(
-                self.api_url,
-                headers=self.headers,
-                json=payload,
-                timeout=30
-            )
-            
-            response.raise_for_status()
-            response_json = response.json()
-            
-            if response_json and "choices" in response_json and len(response_json["choices"]) > 0:
-                content = response_json["choices"][0]["message"]["content"]
-                logger.debug(f"Raw AI response: {content}")
-                
-                # Try to parse the content as JSON
-                try:
-                    # Handle cases where response is wrapped in code fences or other formatting
-                    content = content.strip()
-                    if content.startswith("```json") and content.endswith("```"):
-                        content = content[7:-3].strip()
-                    elif content.startswith("```") and content.endswith("```"):
-                        content = content[3:-3].strip()
-                    
-                    questions = json.loads(content)
-                    if not isinstance(questions, list):
-                        raise ValueError("Response is not a list")
-                    
-                    # Validate and clean questions
-                    valid_questions = [
-                        q for q in questions 
-                        if isinstance(q, str) and len(q.strip()) <= 200 and len(q.strip()) > 0
-                    ]
-                    
-                    if not valid_questions:
-                        raise ValueError("No valid questions generated")
-                    
-                    return {
-                        "success": True,
-                        "questions": valid_questions
-                    }
-                except json.JSONDecodeError as e:
-                    logger.error(f"Failed to parse questions JSON: {str(e)}")
-                    # Fallback: attempt to extract questions from plain text
-                    fallback_questions = self._extract_questions_from_text(content)
-                    if fallback_questions:
-                        return {
-                            "success": True,
-                            "questions": fallback_questions
-                        }
-                    return {
-                        "success": False,
-                        "error": f"Invalid JSON response: {str(e)}",
-                        "questions": []
-                    }
-                except ValueError as e:
-                    logger.error(f"Invalid questions format: {str(e)}")
-                    return {
-                        "success": False,
-                        "error": str(e),
-                        "questions": []
-                    }
-            else:
-                logger.error("No questions returned from API")
-                return {
-                    "success": False,
-                    "error": "No questions returned from API",
-                    "questions": []
-                }
-                
-        except requests.exceptions.RequestException as e:
-            logger.error(f"API request failed: {str(e)}")
-            return {
-                "success": False,
-                "error": f"API request failed: {str(e)}",
-                "questions": []
-            }
-            
-        except Exception as e:
-            logger.error(f"Unexpected error during question generation: {str(e)}")
-            return {
-                "success": False,
-                "error": f"Unexpected error: {str(e)}",
-                "questions": []
-            }
+# Local question bank; categories with fewer unseen questions than this get refilled
+QUESTION_BANK_DB = os.environ.get(
+    "QUESTION_BANK_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "question_bank.db")
+)
+QUESTION_BANK_MIN_UNSEEN = 20
 
-    def _extract_questions_from_text(self, text: str) -> list:
-        """Attempt to extract questions from plain text as a fallback."""
-        lines = text.split('\n')
-        questions = []
-        for line in lines:
-            line = line.strip()
-            # Look for lines that seem like questions (e.g., starting with a number or bullet)
-            if re.match(r'^\d+\.\s|^\*\s|^-\s', line):
-                question = re.sub(r'^\d+\.\s|^\*\s|^-\s', '', line).strip()
-                if len(question) <= 200 and len(question) > 0:
-                    questions.append(question)
-        return questions[:10]  # Limit to max 10 questions
-
-    def _build_evaluation_prompt(self, code: str, language: str, question: Optional[str] = None) -> str:
-        if not language or language.strip() == "":
-            language = self._detect_language(code)
-            
-        if question:
-            prompt = f"""
-Please evaluate the following {language} code that is supposed to solve this problem:
-
-PROBLEM:
-{question}
-
-CODE:
-```{language}
-{code}
-```
-
-Provide a detailed evaluation covering:
-1. Correctness: Does the code correctly solve the problem?
-2. Efficiency: Is the code efficient? Are there any performance concerns?
-3. Code quality: Is the code well-structured, readable, and maintainable?
-4. Best practices: Does the code follow language-specific best practices?
-5. Suggestions for improvement
-
-Please conclude with a numerical grade out of 10 for the overall code quality.
-End your review with a clear "Final Grade: X/10" where X is your numerical assessment.
-
-Format your response as plain text. DO NOT use HTML tags like <h2>, <p>, <ul>, etc.
-Instead, use Markdown formatting like ## for headings, * for bullet points.
-"""
-        else:
-            prompt = f"""
-Please evaluate the following {language} code:
-
-```{language}
-{code}
-```
-
-Provide a detailed evaluation covering:
-1. Functionality: What does this code do?
-2. Efficiency: Is the code efficient? Are there any performance concerns?
-3. Code quality: Is the code well-structured, readable, and maintainable?
-4. Best practices: Does the code follow language-specific best practices?
-5. Suggestions for improvement
-
-Please conclude with a numerical grade out of 10 for the overall code quality.
-End your review with a clear "Final Grade: X/10" where X is your numerical assessment.
-
-Format your response as plain text. DO NOT use HTML tags like <h2>, <p>, <ul>, etc.
-Instead, use Markdown formatting like ## for headings, * for bullet points.
-"""
-        return prompt
-
-    def _detect_language(self, code: str) -> str:
-        code = code.lower()
-        
-        if "def " in code and ":" in code:
-            return "python"
-        elif "function" in code and ("{" in code or "=>" in code):
-            return "javascript"
-        elif "<html" in code or "</div>" in code:
-            return "html"
-        elif "public class" in code or "private void" in code:
-            return "java"
-        elif "#include" in code and ("int main" in code or "void main" in code):
-            return "c++"
-        elif "package main" in code or "func " in code and "{" in code:
-            return "go"
-        else:
-            return "code"
-
-    def _convert_html_to_text(self, text: str) -> str:
-        if re.search(r'<[^>]+>', text):
-            text = re.sub(r'<h1>(.*?)</h1>', r'# \1\n', text)
-            text = re.sub(r'<h2>(.*?)</h2>', r'## \1\n', text)
-            text = re.sub(r'<h3>(.*?)</h3>', r'### \1\n', text)
-            text = re.sub(r'<p>(.*?)</p>', r'\1\n\n', text)
-            text = re.sub(r'<ul>(.*?)</ul>', r'\1\n', text, flags=re.DOTALL)
-            text = re.sub(r'<li>(.*?)</li>', r'* \1\n', text)
-            text = re.sub(r'<code>(.*?)</code>', r'`\1`', text, flags=re.DOTALL)
-            text = re.sub(r'<pre><code>(.*?)</code></pre>', r'```\n\1\n```', text, flags=re.DOTALL)
-            text = re.sub(r'<[^>]+>', '', text)
-            text = html.unescape(text)
-            text = re.sub(r'\n{3,}', '\n\n', text)
-        
-        return text
-
-    def _extract_grade(self, evaluation: str) -> Optional[float]:
-        patterns = [
-            r'Final Grade:\s*(\d+(?:\.\d+)?)/10',
-            r'Grade:\s*(\d+(?:\.\d+)?)/10',
-            r'Overall Grade:\s*(\d+(?:\.\d+)?)/10',
-            r'Score:\s*(\d+(?:\.\d+)?)/10',
-            r'Rating:\s*(\d+(?:\.\d+)?)/10',
-            r'grade of (\d+(?:\.\d+)?)/10',
-            r'grade: (\d+(?:\.\d+)?)/10',
-            r'(\d+(?:\.\d+)?)/10'
-        ]
-        
-        for pattern in patterns:
-            match = re.search(pattern, evaluation, re.IGNORECASE)
-            if match:
-                try:
-                    return float(match.group(1))
-                except ValueError:
-                    pass
-        
-        return None
-    
-    def _calculate_grade(self, evaluation: str) -> float:
-        grade = 7.0
-        
-        positive_indicators = [
-            "excellent", "great", "well structured", "efficient", "clean",
-            "maintainable", "good practice", "best practice", "well organized"
-        ]
-        
-        negative_indicators = [
-            "error", "bug", "issue", "inefficient", "confusing", "poor",
-            "bad practice", "fix", "problem", "security vulnerability",
-            "missing", "redundant", "unnecessary"
-        ]
-        
-        positive_count = sum(evaluation.lower().count(indicator) for indicator in positive_indicators)
-        negative_count = sum(evaluation.lower().count(indicator) for indicator in negative_indicators)
-        
-        adjustment = min(2.5, positive_count * 0.2) - min(4, negative_count * 0.25)
-        grade = max(1, min(10, grade + adjustment))
-        
-        return round(grade, 1)
+# Per-assignment plagiarism index
+SIMILARITY_DB = os.environ.get(
+    "SIMILARITY_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "similarity.db")
+)
+
+evaluator = CodeEvaluator(OPENROUTER_API_KEY, OPENROUTER_MODEL, OPENROUTER_ROUTES, max_workers=ROUTER_WORKERS)
+
+grader = HybridGrader(evaluator, COMPILE_SERVICE_URL)
 
-evaluator = CodeEvaluator(OPENROUTER_API_KEY, OPENROUTER_MODEL)
+def _run_evaluation_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # Jobs run on worker threads; restore the trace of the request that queued them
+    with trace_context(payload.get('trace_id'), payload.get('sampled', False)), \
+            profile_thread(payload.get('profile'), "evaluate-job"):
+        return grader.grade(payload.get('code', ''), payload.get('language', 'python'), payload.get('question', ''),
+                            payload.get('test_cases'))
+
+def _run_review_job(payload: Dict[str, Any]) -> Dict[str, Any]:
+    # LLM review stage of a /submit answer; execution runs in the submit pipeline
+    with trace_context(payload.get('trace_id'), payload.get('sampled', False)), \
+            profile_thread(payload.get('profile'), "review-job"):
+        return evaluator.evaluate_code(payload.get('code', ''), payload.get('language', 'python'), payload.get('question', ''))
+
+job_queue = JobQueue(EVALUATION_QUEUE_DB)
+worker_pool = WorkerPool(job_queue, {"evaluate": _run_evaluation_job, "review": _run_review_job},
+                         num_workers=EVALUATION_WORKERS)
+
+question_bank = QuestionBank(QUESTION_BANK_DB)
+question_refiller = QuestionRefiller(question_bank, evaluator.generate_questions, min_questions=QUESTION_BANK_MIN_UNSEEN)
+
+similarity_index = SimilarityIndex(SIMILARITY_DB)
+
+pipeline = SubmitPipeline(evaluator, grader, COMPILE_SERVICE_URL, max_workers=SUBMIT_WORKERS,
+                          job_queue=job_queue, review_timeout=EVALUATE_WAIT_SECONDS)
+
+def _job_response(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Public view of a job; finished evaluation jobs carry the evaluation fields inline."""
+    response = {
+        "job_id": job["id"],
+        "status": job["status"],
+        "attempts": job["attempts"]
+    }
+    if job["status"] in ("done", "failed") and job["result"]:
+        response.update(job["result"])
+    elif job["status"] == "failed":
+        response.update({
+            "success": False,
+            "error": job["error"],
+            "grade": 0,
+            "result": "error",
+            "review": "Failed to evaluate code. Please try again later."
+        })
+    return response
 
 @app.route('/evaluate', methods=['OPTIONS'])
 @app.route('/generate-questions', methods=['OPTIONS'])
+@app.route('/jobs/bulk', methods=['OPTIONS'])
+@app.route('/submit', methods=['OPTIONS'])
 def options():
     return '', 200
 
 @app.route('/evaluate', methods=['POST'])
 def evaluate():
     data = request.json
-    logger.info(f"Received evaluation request: {json.dumps(data, indent=2)}")
+    logger.info("Received evaluation request: language=%s, code_chars=%d", data.get('language', 'python'), len(data.get('code') or ''))
+    logger.debug("Evaluation request body: %s", Redacted(data))
     
     question = data.get('question', '')
     code = data.get('code', '')
@@ -406,15 +164,142 @@ def evaluate():
             "review": "No code provided for evaluation"
         }), 400
     
-    result = evaluator.evaluate_code(code, language, question)
-    logger.info(f"Evaluation completed with success={result.get('success', False)}, grade={result.get('grade', 'N/A')}")
+    worker_pool.start()
+    job_id = job_queue.enqueue("evaluate", {"code": code, "language": language, "question": question,
+                                            "test_cases": data.get('test_cases'),
+                                            "trace_id": current_trace_id(), "sampled": is_sampled(),
+                                            "profile": profile_job_context()})
+    logger.info("Queued evaluation job %s", job_id)
+    
+    if data.get('async'):
+        return jsonify({"success": True, "job_id": job_id, "status": "queued"}), 202
+    
+    job = job_queue.wait_for(job_id, EVALUATE_WAIT_SECONDS)
+    if job["status"] not in ("done", "failed"):
+        # Still running: the client can poll /jobs/<job_id> for the result
+        return jsonify(_job_response(job)), 202
+    
+    result = _job_response(job)
+    logger.info("Evaluation completed with success=%s, grade=%s", result.get('success', False), result.get('grade', 'N/A'))
     
     return jsonify(result)
 
+@app.route('/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """Poll a job. Pass ?wait=N to long-poll for up to N seconds."""
+    try:
+        wait = float(request.args.get('wait', 0))
+        if math.isnan(wait):
+            raise ValueError(wait)
+    except ValueError:
+        return jsonify({"success": False, "error": "wait must be a number of seconds"}), 400
+    wait = min(wait, EVALUATE_WAIT_SECONDS)
+    job = job_queue.wait_for(job_id, wait) if wait > 0 else job_queue.get(job_id)
+    if job is None:
+        return jsonify({"success": False, "error": f"Unknown job: {job_id}"}), 404
+    return jsonify(_job_response(job))
+
+@app.route('/jobs/bulk', methods=['POST'])
+def enqueue_bulk():
+    """Enqueue many evaluations at once, e.g. to regrade a whole assignment."""
+    data = request.json
+    items = data.get('jobs', [])
+    payloads = [
+        {"code": item.get('code', ''), "language": item.get('language', 'python'), "question": item.get('question', ''),
+         "test_cases": item.get('test_cases')}
+        for item in items if item.get('code')
+    ]
+    if not payloads:
+        return jsonify({"success": False, "error": "No jobs with code provided"}), 400
+    
+    worker_pool.start()
+    batch_id = data.get('batch_id') or str(uuid.uuid4())
+    job_ids = job_queue.enqueue_many("evaluate", payloads, batch_id)
+    logger.info("Queued %d evaluation jobs in batch %s", len(job_ids), batch_id)
+    return jsonify({"success": True, "batch_id": batch_id, "job_ids": job_ids}), 202
+
+@app.route('/jobs/batch/<batch_id>', methods=['GET'])
+def get_batch(batch_id):
+    counts = job_queue.batch_status(batch_id)
+    if not counts:
+        return jsonify({"success": False, "error": f"Unknown batch: {batch_id}"}), 404
+    return jsonify({"success": True, "batch_id": batch_id, "counts": counts,
+                    "complete": set(counts) <= {"done", "failed"}})
+
+def _submission_answers(data: Dict[str, Any]) -> list:
+    """Normalize a submission into a list of answers.
+
+    Accepts either a list of {question, code, language, stdin, test_cases}
+    objects or the client's shape: an {question: code} map plus optional
+    languages, inputs and test_cases maps keyed by question.
+    """
+    answers = data.get('answers', [])
+    if isinstance(answers, list):
+        return [
+            {
+                "question": a.get('question', ''),
+                "code": a.get('code', ''),
+                "language": a.get('language', 'python'),
+                "stdin": a.get('stdin', ''),
+                "test_cases": a.get('test_cases')
+            }
+            for a in answers if a.get('code')
+        ]
+    languages = data.get('languages', {})
+    inputs = data.get('inputs', {})
+    test_cases = data.get('test_cases', {})
+    return [
+        {
+            "question": question,
+            "code": code,
+            "language": languages.get(question, 'python'),
+            "stdin": inputs.get(question, ''),
+            "test_cases": test_cases.get(question)
+        }
+        for question, code in answers.items() if code
+    ]
+
+@app.route('/submit', methods=['POST'])
+def submit():
+    """Execute and review every answer of a submission concurrently.
+
+    Returns one merged JSON response, or with ?stream=1 one NDJSON line per
+    answer as it completes followed by a summary line.
+    """
+    data = request.json
+    answers = _submission_answers(data)
+    if not answers:
+        return jsonify({"success": False, "error": "No answers provided"}), 400
+    
+    logger.info("Received submission with %d answer(s)", len(answers))
+    start = time.monotonic()
+    worker_pool.start()
+    job_payload = {"trace_id": current_trace_id(), "sampled": is_sampled(), "profile": profile_job_context()}
+    
+    if request.args.get('stream'):
+        def generate():
+            marks = {}
+            for result in pipeline.run(answers, job_payload):
+                marks[result["question"]] = result.get("grade", 0)
+                yield json.dumps({"type": "answer", "result": result}) + "\n"
+            yield json.dumps({"type": "summary", "marks": marks,
+                              "total_ms": round((time.monotonic() - start) * 1000, 1)}) + "\n"
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+    
+    results = {}
+    marks = {}
+    for result in pipeline.run(answers, job_payload):
+        results[result["question"]] = result
+        marks[result["question"]] = result.get("grade", 0)
+    
+    total_ms = round((time.monotonic() - start) * 1000, 1)
+    logger.info("Submission processed in %sms", total_ms)
+    return jsonify({"success": True, "results": results, "marks": marks, "timings": {"total_ms": total_ms}})
+
 @app.route('/generate-questions', methods=['POST'])
 def generate_questions():
     data = request.json
-    logger.info(f"Received question generation request: {json.dumps(data, indent=2)}")
+    logger.info("Received question generation request: %s", Redacted(data))
     
     language = data.get('language', '')
     topic = data.get('topic', '')
@@ -429,15 +314,80 @@ def generate_questions():
             "questions": []
         }), 400
     
+    # Questions are only repeated to a requester once the bank runs out of unseen ones
+    requester = data.get('requester') or request.remote_addr or 'anonymous'
+    try:
+        count = int(num_questions)
+    except (TypeError, ValueError):
+        count = 0
+    
+    if count > 0:
+        questions = question_bank.take(language, topic, difficulty, count, requester)
+        if questions is not None:
+            question_refiller.request_refill(language, topic, difficulty, requester)
+            logger.info("Served %d question(s) from the question bank", len(questions))
+            return jsonify({"success": True, "questions": questions, "source": "bank"})
+    
     result = evaluator.generate_questions(language, topic, difficulty, num_questions)
-    logger.info(f"Question generation completed with success={result.get('success', False)}, questions_count={len(result.get('questions', []))}")
+    logger.info("Question generation completed with success=%s, questions_count=%d", result.get('success', False), len(result.get('questions', [])))
+    
+    if result.get('success'):
+        question_bank.add_questions(language, topic, difficulty, result['questions'])
+        question_bank.mark_served(question_bank.find_ids(language, topic, difficulty, result['questions']), requester)
+        question_refiller.request_refill(language, topic, difficulty, requester)
+        result['source'] = 'generated'
     
     return jsonify(result)
 
+@app.route('/questions/search', methods=['GET'])
+def search_questions():
+    """Full-text search over the question bank: ?q=...&language=...&limit=..."""
+    query = request.args.get('q', '')
+    if not query.strip():
+        return jsonify({"success": False, "error": "Missing search query", "questions": []}), 400
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), 100)
+    except ValueError:
+        return jsonify({"success": False, "error": "limit must be an integer", "questions": []}), 400
+    questions = question_bank.search(query, request.args.get('language'), limit)
+    return jsonify({"success": True, "questions": questions})
+
+@app.route('/questions/stats', methods=['GET'])
+def question_bank_stats():
+    return jsonify({"success": True, "categories": question_bank.category_sizes(), "full_text_search": question_bank.fts_enabled})
+
+@app.route('/similarity/<assignment_id>/submissions', methods=['POST'])
+def add_similarity_submission(assignment_id):
+    """Index a submission and return near-duplicates already in the assignment."""
+    data = request.json
+    submission_id = data.get('submission_id', '')
+    code = data.get('code', '')
+    language = data.get('language', 'python')
+    
+    if not submission_id or not code:
+        return jsonify({"success": False, "error": "submission_id and code are required", "matches": []}), 400
+    
+    matches = similarity_index.add_submission(assignment_id, submission_id, code, language)
+    logger.info("Indexed submission %s for assignment %s: %d match(es)", submission_id, assignment_id, len(matches))
+    return jsonify({"success": True, "submission_id": submission_id, "matches": matches})
+
+@app.route('/similarity/<assignment_id>/submissions/<submission_id>/matches', methods=['GET'])
+def get_similarity_matches(assignment_id, submission_id):
+    matches = similarity_index.query(assignment_id, submission_id)
+    if matches is None:
+        return jsonify({"success": False, "error": f"Unknown submission: {submission_id}", "matches": []}), 404
+    return jsonify({"success": True, "submission_id": submission_id, "matches": matches})
+
 @app.route('/health', methods=['GET'])
 def health_check():
-    return jsonify({"status": "ok", "message": "API is running"})
+    return jsonify({"status": "ok", "message": "API is running", "jobs": job_queue.counts()})
+
+@app.route('/router-stats', methods=['GET'])
+def router_stats():
+    """Per-model latency, error and circuit breaker statistics."""
+    return jsonify({"models": evaluator.router.get_stats()})
 
 if __name__ == '__main__':
     logger.info("Starting Code Evaluation and Question Generation API server on port 5001")
+    worker_pool.start()
     app.run(debug=True, port=5001)
\ No newline at end of file
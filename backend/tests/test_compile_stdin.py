@@ -0,0 +1,28 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HARNESS = """
+import sys
+import compile
+cases = [{"input": "", "expected_output": "0"}, {"input": "abc", "expected_output": "3"}]
+results = compile.run_test_cases([sys.executable, "-c", "import sys; print(len(sys.stdin.read()))"],
+                                 None, cases)
+print([r["passed"] for r in results])
+"""
+
+
+def test_empty_test_input_reads_eof_even_when_server_stdin_is_open():
+    # The server's own stdin is a pipe nobody writes to or closes
+    process = subprocess.Popen([sys.executable, "-c", HARNESS], cwd=BACKEND, stdin=subprocess.PIPE,
+                               stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True,
+                               env=dict(os.environ, LOG_LEVEL="ERROR", COMPILE_WARMUP="0"))
+    try:
+        # wait() rather than communicate(), which would close the pipe
+        process.wait(timeout=8)
+    finally:
+        process.kill()
+        process.stdin.close()
+    assert process.stdout.read().strip().splitlines()[-1] == "[True, True]"
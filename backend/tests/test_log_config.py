@@ -0,0 +1,25 @@
+import logging
+import logging.handlers
+import queue
+
+from log_config import Redacted, _DeferredQueueHandler
+
+
+def test_message_is_rendered_before_the_caller_mutates_its_arguments():
+    records = queue.SimpleQueue()
+    logger = logging.getLogger("test_log_config")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    handler = _DeferredQueueHandler(records)
+    logger.addHandler(handler)
+    try:
+        result = {"stdout": "x" * 10, "stderr": ""}
+        logger.info("Run result: %s", Redacted(result), extra={"fields": {"phase": "run"}})
+        # What compact_result does after the log call returns
+        result["stdout"] = "x"
+        result["truncated"] = {"stdout": 10}
+    finally:
+        logger.removeHandler(handler)
+    record = records.get_nowait()
+    assert record.getMessage() == 'Run result: {"stdout": "xxxxxxxxxx", "stderr": ""}'
+    assert record.fields == {"phase": "run"}
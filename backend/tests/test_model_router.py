@@ -0,0 +1,92 @@
+import threading
+import time
+
+import pytest
+import requests
+
+from model_router import ModelRouter, RouterError
+
+ROUTES = [{"model": "a", "latency_budget": 0.4}, {"model": "b", "latency_budget": 2}]
+
+
+class FakeResponse:
+    def __init__(self, model):
+        self.model = model
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"choices": [{"message": {"content": f"from {self.model}"}}]}
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    """Patch Session.post: models listed in upstream["hang"] time out, the rest answer after upstream["delay"]."""
+    state = {"hang": set(), "delay": 0.01, "calls": [], "release": threading.Event()}
+
+    def post(session, url, headers=None, json=None, timeout=None):
+        state["calls"].append(json["model"])
+        if json["model"] in state["hang"]:
+            state["release"].wait(timeout)
+            raise requests.exceptions.Timeout(f"{json['model']} timed out")
+        time.sleep(state["delay"])
+        return FakeResponse(json["model"])
+
+    monkeypatch.setattr(requests.Session, "post", post)
+    return state
+
+
+def test_hedged_loser_still_records_its_timeout(upstream):
+    upstream["hang"].add("a")
+    router = ModelRouter(ROUTES, "http://upstream", {}, failure_threshold=3, cooldown=60)
+    for _ in range(3):
+        assert router.chat_completion({"messages": []})["routed_model"] == "b"
+    # The abandoned attempts on "a" finish on their own (timeout 0.4s)
+    time.sleep(0.6)
+    stats = router.get_stats()["a"]
+    assert stats["errors"] == 3
+    assert stats["circuit"] == "open"
+    assert stats["latency_p50"] is not None
+
+    calls = len(upstream["calls"])
+    assert router.chat_completion({"messages": []})["routed_model"] == "b"
+    assert upstream["calls"][calls:] == ["b"]
+
+
+def test_half_open_breaker_admits_one_probe(upstream):
+    upstream["hang"].add("a")
+    router = ModelRouter(ROUTES[:1], "http://upstream", {}, failure_threshold=1, cooldown=0.05)
+    with pytest.raises(RouterError):
+        router.chat_completion({"messages": []})
+    time.sleep(0.1)
+    assert router.get_stats()["a"]["circuit"] == "half-open"
+
+    calls = len(upstream["calls"])
+    results = []
+
+    def call():
+        try:
+            results.append(router.chat_completion({"messages": []}))
+        except RouterError as e:
+            results.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(5)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert upstream["calls"][calls:] == ["a"]
+    assert all(isinstance(result, RouterError) for result in results)
+    assert router.get_stats()["a"]["circuit"] == "open"
+
+
+def test_probe_success_closes_breaker(upstream):
+    upstream["hang"].add("a")
+    router = ModelRouter(ROUTES[:1], "http://upstream", {}, failure_threshold=1, cooldown=0.05)
+    with pytest.raises(RouterError):
+        router.chat_completion({"messages": []})
+    time.sleep(0.1)
+    upstream["hang"].clear()
+    assert router.chat_completion({"messages": []})["routed_model"] == "a"
+    assert router.get_stats()["a"]["circuit"] == "closed"
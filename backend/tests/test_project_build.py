@@ -0,0 +1,202 @@
+import os
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from project_build import ProjectBuilder, ProjectSessionStore
+
+
+def run_command(command, cwd=None, timeout=10, stdin_data=None):
+    completed = subprocess.run(command, cwd=cwd, input=stdin_data, capture_output=True, text=True, timeout=timeout)
+    return {"stdout": completed.stdout, "stderr": completed.stderr, "returncode": completed.returncode}
+
+
+class FakeJavac:
+    """Stands in for javac: records which sources each run compiled and writes empty .class files.
+
+    Like javac, a run fails with "cannot find symbol" when a compiled source uses a
+    capitalised type that is neither declared in the run nor on the class path.
+    """
+
+    BUILTIN_TYPES = {"String", "System", "Math"}
+
+    def __init__(self):
+        self.runs = []
+
+    def __call__(self, command, cwd=None, timeout=10, stdin_data=None):
+        sources = [arg for arg in command if arg.endswith(".java")]
+        self.runs.append(sorted(os.path.basename(source) for source in sources))
+        out_dir = command[command.index("-d") + 1]
+        texts = {}
+        for source in sources:
+            with open(source) as f:
+                texts[source] = f.read()
+        declared = {name for text in texts.values() for name in re.findall(r'\b(?:class|interface)\s+(\w+)', text)}
+        available = declared | {name[:-6] for name in os.listdir(out_dir) if name.endswith(".class")}
+        errors = [f"{os.path.basename(source)}: error: cannot find symbol\n  symbol: class {name}"
+                  for source, text in texts.items()
+                  for name in sorted(set(re.findall(r'\b[A-Z]\w*', text)) - available - self.BUILTIN_TYPES)]
+        if errors:
+            return {"stdout": "", "stderr": "\n".join(errors), "returncode": 1}
+        for name in declared:
+            open(os.path.join(out_dir, f"{name}.class"), 'w').close()
+        return {"stdout": "", "stderr": "", "returncode": 0}
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProjectSessionStore(root=str(tmp_path))
+
+
+def build(builder, session, language, files, entry=None):
+    changed, removed = session.sync(files)
+    return builder.build(session, language, changed, removed, entry)
+
+
+def run_program(report):
+    return run_command(report["run_command"])["stdout"].strip()
+
+
+NATIVE_PROJECTS = {
+    "c": {
+        "config.h": "#define SCALE 2\n",
+        "util.h": '#include "config.h"\nint scale(int x);\n',
+        "util.c": '#include "util.h"\nint scale(int x) { return x * SCALE; }\n',
+        "main.c": '#include <stdio.h>\n#include "util.h"\nint main(void) { printf("%d\\n", scale(21)); return 0; }\n',
+        "other.c": "int unused(void) { return 0; }\n"
+    },
+    "cpp": {
+        "config.h": "#define SCALE 2\n",
+        "util.hpp": '#include "config.h"\nint scale(int x);\n',
+        "util.cpp": '#include "util.hpp"\nint scale(int x) { return x * SCALE; }\n',
+        "main.cpp": '#include <iostream>\n#include "util.hpp"\nint main() { std::cout << scale(21) << std::endl; }\n',
+        "other.cpp": "int unused() { return 0; }\n"
+    }
+}
+
+
+@pytest.mark.parametrize("language", ["c", "cpp"])
+def test_native_header_change_recompiles_only_including_units(store, language):
+    if not shutil.which({"c": "gcc", "cpp": "g++"}[language]):
+        pytest.skip("compiler not installed")
+    files = dict(NATIVE_PROJECTS[language])
+    ext = "c" if language == "c" else "cpp"
+    builder = ProjectBuilder(run_command)
+    session = store.get("native")
+    session.reset(language)
+
+    report = build(builder, session, language, files)
+    assert report["compiled"] == sorted(f"{name}.{ext}" for name in ("main", "other", "util"))
+    assert run_program(report) == "42"
+
+    report = build(builder, session, language, files)
+    assert report["compiled"] == []
+    assert not report["linked"]
+
+    # config.h is only included through the util header; both users of it rebuild
+    files["config.h"] = "#define SCALE 3\n"
+    report = build(builder, session, language, files)
+    assert report["compiled"] == [f"main.{ext}", f"util.{ext}"]
+    assert report["reused"] == [f"other.{ext}"]
+    assert run_program(report) == "63"
+
+    files[f"other.{ext}"] = "int unused(void) { return 1; }\n" if language == "c" else "int unused() { return 1; }\n"
+    report = build(builder, session, language, files)
+    assert report["compiled"] == [f"other.{ext}"]
+    assert report["linked"]
+
+
+JAVA_PROJECT = {
+    "Main.java": "public class Main { public static void main(String[] a) { System.out.println(new Shape().area()); } }",
+    "Shape.java": "class Shape { double area() { return Util.pi() * 2; } }",
+    "Util.java": "class Util { static double pi() { return 3.0; } }",
+    "Other.java": "class Other { int x; }"
+}
+
+
+def test_java_change_recompiles_transitive_dependents(store):
+    javac = FakeJavac()
+    builder = ProjectBuilder(javac)
+    session = store.get("java")
+    session.reset("java")
+    files = dict(JAVA_PROJECT)
+
+    report = build(builder, session, "java", files)
+    assert report["compiled"] == ["Main.java", "Other.java", "Shape.java", "Util.java"]
+    assert report["run_command"][-1] == "Main"
+
+    report = build(builder, session, "java", files)
+    assert report["compiled"] == []
+    assert len(javac.runs) == 1
+
+    # Shape references Util and Main references Shape
+    files["Util.java"] = "class Util { static double pi() { return 3.5; } }"
+    report = build(builder, session, "java", files)
+    assert report["compiled"] == ["Main.java", "Shape.java", "Util.java"]
+    assert javac.runs[-1] == ["Main.java", "Shape.java", "Util.java"]
+
+    files["Other.java"] = "class Other { int y; }"
+    report = build(builder, session, "java", files)
+    assert report["compiled"] == ["Other.java"]
+
+
+JAVA_SHARED_FILE_PROJECT = {
+    "Main.java": "public class Main { public static void main(String[] a) { System.out.println(new Shape().area()); } }",
+    "Shape.java": "class Shape { double area() { return Util.pi() * 2; } }",
+    "Util.java": "class Util { static double pi() { return 3.0; } }\nclass Extra { }",
+    "Other.java": "class Other { int x; }"
+}
+
+
+@pytest.mark.parametrize("removal", ["file", "type"])
+def test_java_removed_type_recompiles_unchanged_dependents(store, removal):
+    builder = ProjectBuilder(FakeJavac())
+    session = store.get(f"java-removed-{removal}")
+    session.reset("java")
+    files = dict(JAVA_SHARED_FILE_PROJECT)
+    assert build(builder, session, "java", files)["compilation"]["returncode"] == 0
+
+    # Shape.java itself is untouched; only the Util type it uses goes away
+    if removal == "file":
+        del files["Util.java"]
+    else:
+        files["Util.java"] = "class Extra { }"
+    report = build(builder, session, "java", files)
+    assert "Shape.java" in report["compiled"]
+    assert "Other.java" not in report["compiled"]
+    assert report["compilation"]["returncode"] != 0
+    assert "Shape.java: error: cannot find symbol\n  symbol: class Util" in report["compilation"]["stderr"]
+    assert not os.path.exists(os.path.join(session.build_dir, "Util.class"))
+    assert "run_command" not in report
+
+
+def test_java_real_compiler(store):
+    if not (shutil.which("javac") and shutil.which("java")):
+        pytest.skip("JDK not installed")
+    builder = ProjectBuilder(run_command)
+    session = store.get("javac")
+    session.reset("java")
+    files = dict(JAVA_PROJECT)
+    assert run_program(build(builder, session, "java", files)) == "6.0"
+
+    files["Util.java"] = "class Util { static double pi() { return 3.5; } }"
+    report = build(builder, session, "java", files)
+    assert report["compiled"] == ["Main.java", "Shape.java", "Util.java"]
+    assert run_program(report) == "7.0"
+
+    del files["Util.java"]
+    report = build(builder, session, "java", files)
+    assert "Shape.java" in report["compiled"]
+    assert report["compilation"]["returncode"] != 0
+    assert "cannot find symbol" in report["compilation"]["stderr"]
+
+
+def test_store_without_root_removes_its_directory_on_close():
+    store = ProjectSessionStore()
+    session = store.get("temp")
+    session.reset("python")
+    assert os.path.isdir(store.root)
+    store.close()
+    assert not os.path.exists(store.root)
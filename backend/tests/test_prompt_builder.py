@@ -0,0 +1,27 @@
+import time
+
+from prompt_builder import _LITERAL_LINE, build_evaluation_prompt, compact_code
+
+
+def test_long_digit_run_before_non_literal_does_not_backtrack():
+    start = time.monotonic()
+    assert not _LITERAL_LINE.match('1' * 200 + 'x')
+    assert not _LITERAL_LINE.match('1, ' * 70 + '1x')
+    assert time.monotonic() - start < 0.5
+
+
+def test_prompt_with_long_number_on_literal_line_is_fast():
+    code = "import math\nPI_DIGITS = [\n    3141592653589793238462643383279, math.pi,\n]\nprint(PI_DIGITS)\n"
+    start = time.monotonic()
+    prompt, _, _ = build_evaluation_prompt(code, "python")
+    assert time.monotonic() - start < 0.5
+    assert "3141592653589793238462643383279, math.pi," in prompt
+
+
+def test_literal_lines_still_collapse():
+    rows = [f"    [{i}, {i * 2.5}, -{i}, 0x{i:X}, \"row {i}\", None]," for i in range(10)]
+    code = "DATA = [\n" + "\n".join(rows) + "\n]\nprint(len(DATA))\n"
+    lines = compact_code(code, "python")
+    assert any(number is None and "8 lines of literal data omitted" in text for number, text in lines)
+    assert _LITERAL_LINE.match('{"a": 1, "b": [2.5e3, -4]},')
+    assert not _LITERAL_LINE.match('foo(1),')
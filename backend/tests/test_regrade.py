@@ -0,0 +1,52 @@
+import json
+
+from regrade import Regrader, load_checkpoint, read_answers
+
+
+class StubEvaluator:
+    """Review outcome per question: "ok", "down" (upstream failure) or "too_large" (not retryable)."""
+
+    def __init__(self, outcomes):
+        self.outcomes = outcomes
+
+    def evaluate_code(self, code, language, question=None):
+        outcome = self.outcomes[question]
+        if outcome == "ok":
+            return {"success": True, "grade": 8, "review": "Looks good.", "result": "success"}
+        if outcome == "too_large":
+            return {"success": False, "error": "Submission is too large", "grade": 0, "result": "error",
+                    "review": "Submission is too large", "retryable": False}
+        return {"success": False, "error": "API request failed: 503", "grade": 0, "result": "error",
+                "review": "Failed to evaluate code. Please try again later."}
+
+
+def write_jsonl(path, rows):
+    path.write_text(''.join(json.dumps(row) + "\n" for row in rows))
+
+
+def test_failed_reviews_are_not_checkpointed(tmp_path):
+    tests = [{"input": "", "expected_output": "1"}]
+    source = tmp_path / "submissions.jsonl"
+    write_jsonl(source, [
+        {"id": "ok", "question": "q-ok", "code": "print(1)", "language": "python"},
+        {"id": "down", "question": "q-down", "code": "print(2)", "language": "python"},
+        {"id": "down-tests", "question": "q-down", "code": "print(1)", "language": "python", "test_cases": tests},
+        {"id": "too-large", "question": "q-large", "code": "print(3)", "language": "python"}
+    ])
+    output = tmp_path / "regraded.jsonl"
+    evaluator = StubEvaluator({"q-ok": "ok", "q-down": "down", "q-large": "too_large"})
+
+    regrader = Regrader(str(output), workers=1, llm_concurrency=2, llm_rate=100, use_llm=True, evaluator=evaluator)
+    failed = regrader.run(list(read_answers(str(source), {})))
+
+    assert failed == 2
+    assert load_checkpoint(str(output)) == {"ok", "too-large"}
+
+    # Once the upstream recovers, a resumed run grades only what failed
+    evaluator.outcomes["q-down"] = "ok"
+    done = load_checkpoint(str(output))
+    remaining = [a for a in read_answers(str(source), {}) if a["id"] not in done]
+    assert Regrader(str(output), 1, 2, 100, True, evaluator=evaluator).run(remaining) == 0
+    rows = {row["id"]: row for row in map(json.loads, output.read_text().splitlines())}
+    assert set(rows) == {"ok", "down", "down-tests", "too-large"}
+    assert rows["down-tests"]["grade"] == 10.0 and rows["down-tests"]["llm_used"]
@@ -0,0 +1,72 @@
+import threading
+import time
+
+import pytest
+
+from hybrid_grader import HybridGrader
+from submit_pipeline import SubmitPipeline
+
+
+class SlowEvaluator:
+    """LLM review stand-in that blocks until released."""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.calls = 0
+
+    def evaluate_code(self, code, language, question=None):
+        self.calls += 1
+        self.release.wait(5)
+        return {"success": True, "grade": 8, "review": "fine", "result": "success"}
+
+
+class FakeResponse:
+    def __init__(self, body):
+        self.body = body
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return dict(self.body)
+
+
+COMPILE_FAILED = {"success": False, "phase": "compilation",
+                  "compilation": {"stdout": "", "stderr": "error: expected ')'", "returncode": 1}}
+ALL_TESTS_FAILED = {"success": True, "tests": [{"index": 0, "passed": False, "stdout": "2", "stderr": "",
+                                                "returncode": 0}],
+                    "tests_passed": 0, "tests_total": 1}
+
+
+@pytest.fixture
+def pipeline():
+    evaluator = SlowEvaluator()
+    pipeline = SubmitPipeline(evaluator, HybridGrader(evaluator, "http://compile"), "http://compile", max_workers=2)
+    yield pipeline
+    evaluator.release.set()
+
+
+@pytest.mark.parametrize("execution", [COMPILE_FAILED, ALL_TESTS_FAILED])
+def test_decided_grade_does_not_wait_for_review(pipeline, monkeypatch, execution):
+    # Let the review start first, so it can no longer be cancelled
+    started = threading.Event()
+    evaluate = pipeline.evaluator.evaluate_code
+
+    def evaluate_code(*args):
+        started.set()
+        return evaluate(*args)
+
+    def post(url, json=None, headers=None, timeout=None):
+        started.wait(1)
+        return FakeResponse(execution)
+
+    monkeypatch.setattr(pipeline.evaluator, "evaluate_code", evaluate_code)
+    monkeypatch.setattr(pipeline.session, "post", post)
+    answer = {"code": "int main( {", "language": "c", "question": "q",
+              "test_cases": [{"input": "", "expected_output": "1"}]}
+    start = time.monotonic()
+    result = pipeline.run_answer(answer)
+    assert time.monotonic() - start < 1
+    assert result["grade"] == 0.0
+    assert result["llm_used"] is False
+    assert result["timings"]["evaluate_ms"] is None
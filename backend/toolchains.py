@@ -0,0 +1,174 @@
+import importlib
+import logging
+import shutil
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Compilers/interpreters and the flag that prints their version
+TOOLCHAINS = {
+    "gcc": ["--version"],
+    "g++": ["--version"],
+    "javac": ["-version"],
+    "java": ["-version"],
+    "python": ["--version"],
+    "node": ["--version"]
+}
+
+# Optional formatting libraries, imported on first use
+FORMATTERS = {
+    "autopep8": "autopep8",
+    "jsbeautifier": "jsbeautifier",
+    "clang_format": "clang.format"
+}
+
+VERSION_TIMEOUT = 10
+
+
+class ToolchainRegistry:
+    """Resolves compilers, interpreters and formatters once and caches the result.
+
+    start() probes every entry in parallel on background threads and returns
+    immediately; a lookup that arrives before its probe finishes waits for just
+    that probe, and a lookup on a registry that was never started resolves the
+    entry on demand. Warmup runs one trivial program per language afterwards so
+    the first real request does not pay for cold compiler caches.
+    """
+
+    def __init__(self, toolchains: Dict[str, list] = None, formatters: Dict[str, str] = None):
+        self.toolchain_args = dict(toolchains or TOOLCHAINS)
+        self.formatter_modules = dict(formatters or FORMATTERS)
+        self.lock = threading.Lock()
+        self.futures = {}
+        self.toolchains = {}
+        self.formatters = {}
+        self.modules = {}
+        self.warmup = {}
+        self.created = time.monotonic()
+        self.ready_ms = None
+        self.executor = None
+
+    def start(self, warmup: Optional[Callable[[str], Optional[bool]]] = None, languages=()):
+        """Probe everything in the background, then call warmup(language) once per language.
+
+        warmup returns True/False for success, or None when the language was skipped.
+        """
+        with self.lock:
+            if self.executor is not None:
+                return
+            workers = len(self.toolchain_args) + len(self.formatter_modules)
+            self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="toolchain")
+            for name in self.toolchain_args:
+                self.futures[("toolchain", name)] = self.executor.submit(self._resolve_toolchain, name)
+            for name in self.formatter_modules:
+                self.futures[("formatter", name)] = self.executor.submit(self._import_formatter, name)
+        threading.Thread(target=self._finish_startup, args=(warmup, list(languages)),
+                         daemon=True, name="toolchain-startup").start()
+
+    def _finish_startup(self, warmup, languages):
+        for future in list(self.futures.values()):
+            future.result()
+        self.ready_ms = round((time.monotonic() - self.created) * 1000, 1)
+        logger.info("Toolchain discovery finished in %.1fms: %s", self.ready_ms,
+                    {name: info["available"] for name, info in self.toolchains.items()})
+        if warmup is None:
+            return
+        for language in languages:
+            self.warmup[language] = {"status": "pending"}
+        futures = {language: self.executor.submit(self._warm, warmup, language) for language in languages}
+        for future in futures.values():
+            future.result()
+
+    def _warm(self, warmup, language):
+        start = time.monotonic()
+        try:
+            ok = warmup(language)
+            status = "skipped" if ok is None else ("ok" if ok else "failed")
+        except Exception as e:
+            logger.warning("Warmup for %s raised: %s", language, e)
+            status = "failed"
+        self.warmup[language] = {"status": status, "ms": round((time.monotonic() - start) * 1000, 1)}
+
+    def _resolve_toolchain(self, name):
+        start = time.monotonic()
+        path = shutil.which(name)
+        info = {"available": False, "path": path, "version": None}
+        if path:
+            try:
+                completed = subprocess.run([path] + self.toolchain_args[name], capture_output=True,
+                                           text=True, timeout=VERSION_TIMEOUT)
+                # java/javac print their version on stderr
+                output = (completed.stdout or completed.stderr).strip()
+                info["available"] = completed.returncode == 0
+                info["version"] = output.splitlines()[0] if output else None
+            except (OSError, subprocess.TimeoutExpired) as e:
+                logger.warning("Could not run %s: %s", name, e)
+        if not info["available"]:
+            logger.warning("Toolchain %s not available; those submissions will be rejected.", name)
+        info["resolve_ms"] = round((time.monotonic() - start) * 1000, 1)
+        self.toolchains[name] = info
+        return info
+
+    def _import_formatter(self, name):
+        start = time.monotonic()
+        try:
+            self.modules[name] = importlib.import_module(self.formatter_modules[name])
+            available = True
+        except ImportError:
+            logger.warning("%s not available. Will use fallback formatter.", name)
+            available = False
+        self.formatters[name] = {"available": available, "import_ms": round((time.monotonic() - start) * 1000, 1)}
+        return self.formatters[name]
+
+    def _wait(self, kind, name, resolve):
+        with self.lock:
+            future = self.futures.get((kind, name))
+            if future is None:
+                future = self.futures[(kind, name)] = _Resolved(resolve, name)
+        return future.result()
+
+    def toolchain(self, name: str) -> Dict[str, Any]:
+        return self._wait("toolchain", name, self._resolve_toolchain)
+
+    def is_available(self, name: str) -> bool:
+        return self.toolchain(name)["available"]
+
+    def formatter(self, name: str):
+        """The imported formatter module, or None when it is not installed."""
+        self._wait("formatter", name, self._import_formatter)
+        return self.modules.get(name)
+
+    def formatters_available(self) -> Dict[str, bool]:
+        return {name: self.formatter(name) is not None for name in self.formatter_modules}
+
+    def status(self) -> Dict[str, Any]:
+        """Non-blocking snapshot for health endpoints; unfinished probes show as pending."""
+        return {
+            "ready": self.ready_ms is not None,
+            "startup_ms": self.ready_ms,
+            "toolchains": {name: self.toolchains.get(name, {"available": None, "status": "pending"})
+                           for name in self.toolchain_args},
+            "formatters": {name: self.formatters.get(name, {"available": None, "status": "pending"})
+                           for name in self.formatter_modules},
+            "warmup": dict(self.warmup)
+        }
+
+
+class _Resolved:
+    """Future-like wrapper for an entry resolved on demand, outside start()."""
+
+    def __init__(self, resolve, name):
+        self.lock = threading.Lock()
+        self.resolve = resolve
+        self.name = name
+        self.value = None
+
+    def result(self):
+        with self.lock:
+            if self.value is None:
+                self.value = self.resolve(self.name)
+            return self.value
@@ -1093,6 +1093,7 @@ const SubmissionScreen = () => {
           code: code,
           language: language,
           stdin: inputValues[question] || "",
+          compact: true,
         }),
       });
 
@@ -1131,36 +1132,37 @@ const SubmissionScreen = () => {
     const marks = {};
 
     try {
-      for (const [question, code] of Object.entries(answers)) {
-        const language = selectedLanguages[question] || "python";
-
-        try {
-          const response = await fetch("http://localhost:5001/evaluate", {
-            method: "POST",
-            headers: {
-              "Content-Type": "application/json",
-            },
-            body: JSON.stringify({
-              question: question,
-              code: code,
-              language: language,
-            }),
-          });
+      try {
+        // One round trip: the backend runs execution and review for every answer concurrently
+        const response = await fetch("http://localhost:5001/submit", {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+          },
+          body: JSON.stringify({
+            answers: answers,
+            languages: selectedLanguages,
+            inputs: inputValues,
+          }),
+        });
 
-          if (!response.ok) {
-            const errorData = await response.json().catch(() => ({}));
-            throw new Error(errorData.error || `HTTP error! Status: ${response.status}`);
-          }
+        if (!response.ok) {
+          const errorData = await response.json().catch(() => ({}));
+          throw new Error(errorData.error || `HTTP error! Status: ${response.status}`);
+        }
 
-          const data = await response.json();
-          console.log(`Evaluation result for ${question}:`, data);
+        const data = await response.json();
+        console.log("Submission evaluation result:", data);
 
-          evaluations[question] = data;
-          if (data.grade) {
-            marks[question] = data.grade;
+        for (const [question, result] of Object.entries(data.results || {})) {
+          evaluations[question] = result;
+          if (result.grade) {
+            marks[question] = result.grade;
           }
-        } catch (e) {
-          console.error(`Error evaluating code for ${question}:`, e);
+        }
+      } catch (e) {
+        console.error("Error evaluating submission:", e);
+        for (const question of Object.keys(answers)) {
           evaluations[question] = {
             success: false,
             error: e.message,